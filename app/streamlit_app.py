@@ -1,7 +1,11 @@
 # app/streamlit_app.py — Stable hybrid version (local + cloud)
+import hmac
+import json
 import os
 import sys
+import tracemalloc
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 from PyPDF2 import PdfReader
 from dotenv import load_dotenv
@@ -23,6 +27,28 @@ load_dotenv()
 import chromadb
 from chromadb.utils import embedding_functions
 
+# ---- Shared ingest helpers live in scripts/ ----
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from chunk_pdf import analyse_layout, build_records, strip_boilerplate
+from pdf_extract import FALLBACK_EXTRACTOR, extract_page_texts
+from price_tables import parse_price_rows, write_price_db
+from edition_diff import diff_adjacent
+from dedupe import dedupe_records
+from compact_index import drop_snapshots, export_compact
+from conversation import Conversation, query_embedder
+from page_render import PageRenderer
+import papl_qa
+import profiling
+from papl_collections import (
+    PartitionCache,
+    UnknownVersion,
+    discover_versions,
+    generation_name,
+    hnsw_metadata,
+    promote,
+    validate_generation,
+)
+
 # ---- Page setup ----
 st.set_page_config(page_title="PAPL Copilot — Cloud Demo", layout="wide")
 
@@ -48,15 +74,42 @@ def pick_writable_dir(candidates):
 PERSIST_DIR = pick_writable_dir(
     [os.environ.get("CHROMA_DIR", ""), "/mount/data/chroma", "/tmp/chroma"]
 )
+PAGE_CACHE_DIR = pick_writable_dir(
+    [os.environ.get("PAPL_CACHE_DIR", ""), "data/cache/pages", "/tmp/papl_cache/pages"]
+)
+RENDER_CACHE_DIR = pick_writable_dir(
+    [os.environ.get("PAPL_RENDER_CACHE_DIR", ""), "data/cache/render", "/tmp/papl_cache/render"]
+)
 
 CFG = {
     "persist_dir": PERSIST_DIR,
+    "page_cache_dir": PAGE_CACHE_DIR,
+    "render_cache_dir": RENDER_CACHE_DIR,
+    "render_cache_mb": float(os.environ.get("PAPL_RENDER_CACHE_MB", "64")),
     "collection_name": "papl_chunks",
     "default_version": "2025-26",
     "pdf_path": "data/NDIS_PAPL_2025-26.pdf",
+    "price_db": os.environ.get("PAPL_PRICE_DB", "data/papl_prices.duckdb"),
+    "diff_db": os.environ.get("PAPL_DIFF_DB", "data/papl_diff.duckdb"),
+    "extractor": os.environ.get("PAPL_EXTRACTOR", "pypdfium2"),
     "top_k": 12,
     "ctx_k": 6,
+    "chunk_chars": 1800,
+    "chunk_overlap": 220,
+    "dedupe": os.environ.get("PAPL_DEDUPE", "").lower() in ("1", "true", "yes"),  # opt-in near-duplicate merge
+    "dedupe_threshold": float(os.environ.get("PAPL_DEDUPE_THRESHOLD", "0.8")),
     "max_width_px": 1200,
+    "keep_generations": 2,
+    "smoke_query": "price limit",
+    "data_dir": "data",
+    "max_loaded_versions": int(os.environ.get("PAPL_MAX_LOADED_VERSIONS", "2")),
+    "partition_mem_mb": float(os.environ.get("PAPL_PARTITION_MEM_MB", "0")),
+    "hnsw": {"space": "cosine", "M": 16, "construction_ef": 200, "search_ef": 64},
+    "compact_embeddings": os.environ.get("PAPL_COMPACT_EMBEDDINGS", ""),  # "int8" / "float16"
+    "compact_dir": os.environ.get("PAPL_COMPACT_DIR", "data/compact"),
+    # Memory profiling (PAPL_PROFILE=1): admin view at ?admin=<PAPL_ADMIN_TOKEN>, off while no token is set
+    "admin_token": os.environ.get("PAPL_ADMIN_TOKEN", ""),
+    "profile_dump": os.environ.get("PAPL_PROFILE_DUMP") or os.path.join(os.path.dirname(PAGE_CACHE_DIR), "profile.jsonl"),
 }
 
 # ---- Styles ----
@@ -84,63 +137,60 @@ OPENAI_MODE, oai_client = None, None
 
 if OPENAI_KEY:
     try:
-        from openai import OpenAI
-
-        oai_client = OpenAI(api_key=OPENAI_KEY)
-        OPENAI_MODE = "v1"
-    except Exception:
-        try:
-            import openai as _openai
-
-            _openai.api_key = OPENAI_KEY
-            oai_client = _openai
-            OPENAI_MODE = "v0"
-        except Exception as e:
-            st.warning(f"OpenAI SDK not available: {e}")
-            oai_client = None
+        OPENAI_MODE, oai_client = papl_qa.openai_client(OPENAI_KEY)
+    except Exception as e:
+        st.warning(f"OpenAI SDK not available: {e}")
 else:
     st.info("Running in local mode (no OPENAI_API_KEY found).")
 
-# ---- System prompt for model ----
-SYSTEM_PROMPT = """You are a careful assistant answering questions about the NDIS Pricing Arrangements and Price Limits (PAPL).
-Rules:
-1) Answer ONLY using the supplied CONTEXT passages.
-2) If the answer is not explicitly supported by the CONTEXT, reply exactly: "I can’t find that in the PAPL context provided."
-3) Always include citations that reference the PAPL version and page numbers; include clause references when available.
-4) Keep answers concise, plain UK English, and use AUD$ where prices are quoted.
-5) If the user asks for advice beyond the PAPL’s scope (e.g., clinical, legal, policy positions), respond: "Out of scope for PAPL. Please consult the official guidance."
-"""
-
 # =============================================================================
 #  CHROMA PERSISTENT CLIENT
 # =============================================================================
 @st.cache_resource
-def get_collection():
-    client = chromadb.PersistentClient(path=CFG["persist_dir"])
-    return client.get_or_create_collection(CFG["collection_name"])
+def get_client():
+    return chromadb.PersistentClient(path=CFG["persist_dir"])
+
+
+@st.cache_resource
+def get_partitions():
+    # One lazily loaded partition per PAPL edition, resolved through the alias record
+    return PartitionCache(
+        get_client(),
+        CFG["persist_dir"],
+        CFG["collection_name"],
+        capacity=CFG["max_loaded_versions"],
+        mem_budget_mb=CFG["partition_mem_mb"],
+        compact_dir=CFG["compact_dir"] if CFG["compact_embeddings"] else None,
+    )
+
+
+@st.cache_resource
+def get_renderer():
+    # Rendered source pages, shared by all sessions and cached on disk by PDF hash + page
+    return PageRenderer(CFG["render_cache_dir"], CFG["render_cache_mb"])
 
-col = get_collection()
+
+@st.cache_resource
+def get_embedder():
+    return query_embedder(get_partitions())
+
+
+@st.cache_resource
+def get_profiler():
+    # Process-wide RSS / tracemalloc / cache profiler; None unless PAPL_PROFILE is set
+    prof = profiling.from_env()
+    if prof is not None:
+        profiling.watch(prof, get_partitions, get_renderer, CFG["page_cache_dir"], get_embedder)
+    return prof
+
+
+def available_versions():
+    versions = discover_versions(CFG["data_dir"], CFG["persist_dir"], CFG["collection_name"])
+    return versions or [CFG["default_version"]]
 
 # =============================================================================
 #  UTILS
 # =============================================================================
-def split_chunks(text: str, chunk_chars=1800, overlap=220):
-    chunks, start, n = [], 0, len(text)
-    while start < n:
-        end = min(n, start + chunk_chars)
-        window = text[start:end]
-        cut = window.rfind(". ")
-        if cut == -1 or cut < chunk_chars * 0.6:
-            cut = len(window)
-        piece = window[:cut].strip()
-        if piece:
-            chunks.append(piece)
-        if end == n:
-            break
-        start = max(0, start + cut - overlap)
-    return chunks
-
-
 def ingest_now():
     if not OPENAI_KEY:
         st.error(
@@ -154,95 +204,197 @@ def ingest_now():
     ef = embedding_functions.OpenAIEmbeddingFunction(
         api_key=OPENAI_KEY, model_name="text-embedding-3-small"
     )
+    # Page text is cached by PDF hash, so rebuilds skip PDF parsing entirely
+    try:
+        page_texts = extract_page_texts(CFG["pdf_path"], CFG["extractor"], CFG["page_cache_dir"])
+    except ImportError as e:
+        st.warning(f"{e}; falling back to {FALLBACK_EXTRACTOR}.")
+        page_texts = extract_page_texts(CFG["pdf_path"], FALLBACK_EXTRACTOR, CFG["page_cache_dir"])
     reader = PdfReader(CFG["pdf_path"])
+    patterns, headings = analyse_layout(page_texts, reader)
+    records = list(build_records(page_texts, CFG["default_version"], CFG["pdf_path"],
+                                 CFG["chunk_chars"], CFG["chunk_overlap"],
+                                 patterns=patterns, headings=headings))
+    if CFG["dedupe"] and CFG["dedupe_threshold"]:
+        # Restated tables and boilerplate: keep one chunk, cite the others' pages
+        records, _ = dedupe_records(records, CFG["dedupe_threshold"])
     ids, docs, metas = [], [], []
-    doc_id = 0
-    for i, page in enumerate(reader.pages):
-        raw = page.extract_text() or ""
-        txt = " ".join(raw.split())
-        if not txt:
-            continue
-        for j, piece in enumerate(split_chunks(txt), start=1):
-            meta = {
-                "papl_version": CFG["default_version"],
-                "page": i + 1,
-                "section_title": "",
-                "clause_ref": "",
-                "source_pdf_path": CFG["pdf_path"],
-            }
-            ids.append(f"p{i+1}_c{j}_{doc_id}")
-            docs.append(piece)
-            metas.append(meta)
-            doc_id += 1
+    for rec in records:
+        ids.append(rec["id"])
+        docs.append(rec["text"])
+        metas.append(rec["metadata"])
     if not ids:
         st.error("No text could be extracted from the PDF.")
         return False
+
+    # Build into a staging generation; the live collection keeps serving meanwhile
+    client = get_client()
+    staging = client.create_collection(
+        generation_name(CFG["collection_name"], CFG["default_version"]),
+        metadata=hnsw_metadata(CFG["hnsw"]),
+    )
     for k in range(0, len(ids), 256):
-        col.upsert(ids=ids[k:k+256], documents=docs[k:k+256], metadatas=metas[k:k+256])
-    st.success(f"Ingested {len(ids)} chunks into collection '{CFG['collection_name']}'.")
+        staging.upsert(ids=ids[k:k+256], documents=docs[k:k+256], metadatas=metas[k:k+256])
+    try:
+        validate_generation(staging, len(ids), CFG["smoke_query"])
+    except ValueError as e:
+        client.delete_collection(staging.name)
+        st.error(f"New index failed validation, keeping the current one: {e}")
+        return False
+    if CFG["compact_embeddings"]:
+        export_compact(staging, os.path.join(CFG["compact_dir"], staging.name), CFG["compact_embeddings"])
+    dropped = promote(client, CFG["persist_dir"], CFG["collection_name"], staging.name,
+                      keep=CFG["keep_generations"], version=CFG["default_version"])
+    drop_snapshots(CFG["compact_dir"], dropped)
+    get_partitions().evict(CFG["default_version"])
+    st.success(
+        f"Ingested {len(ids)} chunks into '{staging.name}' "
+        f"(now live as '{CFG['collection_name']}@{CFG['default_version']}')."
+    )
+
+    # Price-limit tables go to DuckDB so price questions skip retrieval and the LLM
+    price_rows = parse_price_rows([strip_boilerplate(t, patterns) for t in page_texts], CFG["default_version"])
+    try:
+        write_price_db(CFG["price_db"], CFG["default_version"], price_rows)
+    except Exception as e:
+        st.warning(f"Price table not updated ({e}); price questions will use search.")
+
+    # Precompute what changed against the neighbouring editions
+    try:
+        diff_adjacent(client, CFG["persist_dir"], CFG["collection_name"], CFG["diff_db"],
+                      [CFG["default_version"]])
+    except Exception as e:
+        st.warning(f"Edition diff not updated ({e}).")
     return True
 
 
 def retrieve(query: str, version: str, top_k: int = 12):
-    res = col.query(query_texts=[query], n_results=top_k, where={"papl_version": version})
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
-    dists = res.get("distances", [[]])[0] or []
-    rows = []
-    for i, (d, m) in enumerate(zip(docs, metas)):
-        rows.append(
-            {
-                "rank": i + 1,
-                "score": dists[i] if i < len(dists) else None,
-                "preview": (d[:360] + "…") if len(d) > 360 else d,
-                "page": m.get("page"),
-                "section": m.get("section_title", ""),
-                "clause_ref": m.get("clause_ref", ""),
-                "papl_version": m.get("papl_version", ""),
-                "pdf": m.get("source_pdf_path", ""),
-                "full_text": d,
-                "_meta": m,
-            }
-        )
-    return rows
+    return papl_qa.retrieve(get_partitions(), [query], version, top_k)[0]
+
+
+def price_answer(question: str, version: str):
+    return papl_qa.price_answer(CFG["price_db"], question, version)
+
+
+def change_answer(question: str, version: str):
+    return papl_qa.change_answer(CFG["diff_db"], question, version)
 
 
-def answer_with_llm(question: str, ctx_blocks):
+def answer_with_llm(question: str, ctx_blocks, history=()):
     if oai_client is None:
         return None
-    context_text = "\n\n".join(
-        f"[Source: {m.get('papl_version','?')} {m.get('clause_ref','')} p.{m.get('page','?')}] {t}"
-        for (t, m) in ctx_blocks
-    )
-    user = f"Question: {question}\n\nCONTEXT:\n{context_text}\n\nAnswer briefly with citations."
-
     try:
-        if OPENAI_MODE == "v1":
-            response = oai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user},
-                ],
-            )
-            return response.choices[0].message.content.strip()
-        elif OPENAI_MODE == "v0":
-            response = oai_client.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user},
-                ],
-            )
-            return response.choices[0].message["content"].strip()
+        return papl_qa.complete(OPENAI_MODE, oai_client, question, ctx_blocks, history=history)
     except Exception as e:
-        st.error(f"Error calling model: {e}")
+        st.warning(f"Model call failed ({e}); answering from the sources instead.")
         return None
 
 
+def shortcut_answer(q: str, version: str):
+    """(heading, markdown, caption) from the edition diff or price tables, or None."""
+    changes = change_answer(q, version)
+    if changes:
+        return (f"Changes since PAPL {changes[0]}", changes[1],
+                "From the precomputed chunk diff between editions (no search or LLM call).")
+    price_md = price_answer(q, version)
+    if price_md:
+        return ("Answer", price_md, "Answered directly from the PAPL price-limit tables (no search or LLM call).")
+    return None
+
+
+def rag_answer(q: str, rows, ctx_k: int, history=()):
+    """(answer markdown or None, caption) over the top ``ctx_k`` rows."""
+    ans = answer_with_llm(q, [(r["full_text"], r["_meta"]) for r in rows[:ctx_k]], history)
+    if ans:
+        return ans, None
+    local_md, _ = papl_qa.local_answer(q, rows[:ctx_k])
+    if local_md:
+        return local_md, "Extractive answer: the best-matching sentences from the sources below (no LLM call)."
+    return None, "No sentence in the top sources matches the question; see the sources below."
+
+
+@st.fragment
+def show_page(r, key: str):
+    """Checkbox that renders the cited page with the passage highlighted.
+
+    A fragment, so ticking it reruns only this box, not retrieval and the LLM call.
+    """
+    if r["page"] is None:
+        return
+    pdf = papl_qa.source_pdf(r["pdf"], r["papl_version"], {CFG["default_version"]: CFG["pdf_path"]}, CFG["data_dir"])
+    if not pdf:
+        st.warning(f"PDF for PAPL {r['papl_version']} not found, so page {r['page']} can't be shown.")
+        return
+    if st.checkbox(f"Show page {r['page']}", key=key):
+        try:
+            png, _ = get_renderer().render(pdf, int(r["page"]), r["full_text"], crop=True)
+            st.image(png, caption=f"PAPL {r['papl_version']}, p.{r['page']}, cited passage highlighted")
+        except Exception as e:
+            st.warning(f"Page could not be rendered ({e}).")
+
+
+def sources_md(rows, ctx_k: int):
+    lines = []
+    for r in rows[:ctx_k]:
+        also = f" (also p.{r['alt_pages']})" if r["alt_pages"] else ""
+        lines.append(f"- **p.{r['pages']}**{also} {r['preview']}")
+    return "\n".join(lines)
+
+
+def admin_page(prof):
+    st.title("PAPL Copilot — memory profile")
+    c1, c2, c3 = st.columns(3)
+    if c1.toggle("tracemalloc", value=tracemalloc.is_tracing(),
+                 help="Trace Python allocations (slows the app and adds memory while on)."):
+        prof.start_tracing()
+    else:
+        prof.stop_tracing()
+    if c2.button("Set baseline", help="Later reports list allocation growth since now."):
+        prof.mark_baseline()
+    if c3.button("Dump to file"):
+        prof.dump(CFG["profile_dump"])
+        c3.caption(f"Appended to {CFG['profile_dump']}")
+
+    rep = prof.report(top=20)
+    traced = rep["tracemalloc"]
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("RSS", f"{rep['rss_mb']:.0f} MB")
+    m2.metric("Peak RSS", f"{rep['rss_peak_mb']:.0f} MB")
+    m3.metric("Python (traced)", f"{traced['current_mb']:.1f} MB" if traced else "off")
+    m4.metric("Sessions", len(rep["sessions"]))
+    if rep["rss_samples"]:
+        rss = pd.DataFrame(rep["rss_samples"], columns=["time", "RSS MB"])
+        st.line_chart(rss.assign(time=pd.to_datetime(rss["time"], unit="s")).set_index("time"))
+
+    st.subheader("Caches")
+    st.dataframe(pd.DataFrame(profiling.cache_rows(rep)), hide_index=True)
+    st.subheader("Session state")
+    sessions = [{"session": sid[:8], "KB": s["bytes"] / 1024, "largest keys":
+                 ", ".join(f"{k} {v / 1024:.0f} KB" for k, v in sorted(s["keys"].items(), key=lambda kv: -kv[1])[:4])}
+                for sid, s in rep["sessions"].items()]
+    st.dataframe(pd.DataFrame(sessions), hide_index=True)
+    if traced:
+        st.subheader("Top allocations")
+        st.dataframe(pd.DataFrame(traced["top"]), hide_index=True)
+        if "growth" in traced:
+            st.subheader("Growth since baseline")
+            st.dataframe(pd.DataFrame(traced["growth"]), hide_index=True)
+    st.download_button("Download report (JSON)", json.dumps(rep, default=str), "papl_profile.json", "application/json")
+
+
 # =============================================================================
 #  UI
 # =============================================================================
+PROFILER = get_profiler()
+if PROFILER is not None:
+    _ctx = get_script_run_ctx()
+    if _ctx is not None:
+        PROFILER.track_session(_ctx.session_id, st.session_state)
+    if CFG["admin_token"] and hmac.compare_digest(
+        st.query_params.get("admin", "").encode("utf-8"), CFG["admin_token"].encode("utf-8")):
+        admin_page(PROFILER)
+        st.stop()
+
 st.title("NDIS PAPL — Cloud Q&A Demo")
 st.caption("Non-authoritative prototype. Verify in the official PAPL before use.")
 st.markdown(
@@ -268,34 +420,93 @@ This app allows you to:
 )
 st.info(f"Chroma dir: {CFG['persist_dir']}")
 
+versions = available_versions()
+version = st.selectbox("PAPL version", versions, index=0)
+
 # ---- Index status check ----
 try:
-    _probe = col.count() if hasattr(col, "count") else None
+    with get_partitions().lease(version) as (col, _where):
+        _probe = col.count() if hasattr(col, "count") else None
     _empty_index = (_probe == 0) if _probe is not None else False
-except Exception:
+except UnknownVersion:
     _empty_index = True
 
+if _empty_index and version != CFG["default_version"]:
+    # "Build index now" only knows the configured PDF; other editions come from their chunk files
+    st.warning(f"No index for PAPL {version} yet. Build it with "
+               "`python scripts/ingest_papl.py --all-versions`, then reload this page.")
+    st.stop()
 if _empty_index:
     st.warning("Vector index empty. Click **Build index now** to ingest the PAPL PDF.")
     if st.button("Build index now"):
         if ingest_now():
             st.rerun()
+    st.stop()  # nothing to search until an index exists
 
-# ---- Query input ----
-q = st.text_input("Ask a question", placeholder="Type your question and press Enter…")
-if q:
-    rows = retrieve(q, CFG["default_version"], top_k=CFG["top_k"])
-    if not rows:
-        st.warning("No relevant passages found.")
-    else:
-        ctx_blocks = [(r["full_text"], r["_meta"]) for r in rows[: CFG["ctx_k"]]]
-        ans = answer_with_llm(q, ctx_blocks)
-        st.markdown("### Answer")
-        if ans:
-            st.markdown(f'<div class="answer-box">{ans}</div>', unsafe_allow_html=True)
-        else:
-            st.info("Local mode (no API key set): showing top sources only.")
-        st.markdown("### Sources")
-        for i, r in enumerate(rows[: CFG["ctx_k"]]):
-            st.markdown(f"- **p.{r['page']}** {r['preview']}")
+conversation_mode = st.toggle(
+    "Conversation mode", help="Follow-up questions reuse the passages already found and remember the last answer."
+)
 
+if conversation_mode:
+    # ---- Multi-turn chat: one Conversation per session and edition ----
+    conv = st.session_state.get("conversation")
+    if conv is None or conv.version != version:
+        conv = st.session_state["conversation"] = Conversation(version)
+        st.session_state["chat"] = []
+    if st.button("New conversation"):
+        conv.reset()
+        st.session_state["chat"] = []
+    for msg in st.session_state["chat"]:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+            if msg.get("caption"):
+                st.caption(msg["caption"])
+    q = st.chat_input("Ask a question or a follow-up…")
+    if q:
+        with st.chat_message("user"):
+            st.markdown(q)
+        hit = shortcut_answer(q, version)
+        if hit:
+            content, caption = hit[1], hit[2]
+        else:
+            rows, info = conv.retrieve(get_partitions(), get_embedder(), q, CFG["top_k"], CFG["ctx_k"])
+            if rows:
+                ans, caption = rag_answer(q, rows, info["ctx_k"], info["history"])
+                content = (ans or "") + "\n\n**Sources**\n" + sources_md(rows, info["ctx_k"])
+                conv.record_answer(ans or "")
+                how = "reused this conversation's passages" if info["source"] == "pool" else "searched the index"
+                caption = " ".join(filter(None, [caption, f"Retrieval {info['ms']:.0f} ms, {how}."]))
+            else:
+                content, caption = "No relevant passages found.", None
+        with st.chat_message("assistant"):
+            st.markdown(content)
+            if caption:
+                st.caption(caption)
+        st.session_state["chat"] += [{"role": "user", "content": q},
+                                     {"role": "assistant", "content": content, "caption": caption}]
+else:
+    # ---- Single question ----
+    q = st.text_input("Ask a question", placeholder="Type your question and press Enter…")
+    hit = shortcut_answer(q, version) if q else None
+    if hit:
+        st.markdown(f"### {hit[0]}")
+        st.markdown(hit[1])
+        st.caption(hit[2])
+    elif q:
+        rows = retrieve(q, version, top_k=CFG["top_k"])
+        if not rows:
+            st.warning("No relevant passages found.")
+        else:
+            ans, caption = rag_answer(q, rows, CFG["ctx_k"])
+            st.markdown("### Answer")
+            if ans and caption is None:
+                st.markdown(f'<div class="answer-box">{ans}</div>', unsafe_allow_html=True)
+            elif ans:
+                st.markdown(ans)
+                st.caption(caption)
+            else:
+                st.info(caption)
+            st.markdown("### Sources")
+            for i, r in enumerate(rows[: CFG["ctx_k"]]):
+                st.markdown(sources_md([r], 1))
+                show_page(r, key=f"page-{i}-{r['id']}")
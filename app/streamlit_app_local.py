@@ -1,4 +1,5 @@
 import os
+import sys
 import chromadb
 import pandas as pd
 import streamlit as st
@@ -8,6 +9,11 @@ import streamlit as st
 # -----------------------------
 st.set_page_config(page_title="PAPL Copilot — Demo", layout="wide")
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from page_render import PageRenderer
+from papl_collections import PartitionCache, alias_stamp, discover_versions
+from papl_qa import source_pdf, where_clause
+
 # -----------------------------
 # Config
 # -----------------------------
@@ -15,6 +21,12 @@ CFG = {
     "persist_dir": "data/chroma",
     "collection_name": "papl_chunks",
     "default_version": "2025-26",
+    "pdf_path": "data/NDIS_PAPL_2025-26.pdf",
+    "data_dir": "data",
+    "max_loaded_versions": 2,
+    "compact_dir": "data/compact",  # quantised snapshots (compact_index.py) are used when present
+    "render_cache_dir": "data/cache/render",
+    "render_cache_mb": 64,
     "top_k": 12,
     "ctx_k": 6,
     "max_width_px": 1280,
@@ -160,16 +172,32 @@ if OPENAI_KEY:
             oai_client = None
 
 # -----------------------------
-# Chroma collection (cached)
+# Chroma partitions, one per PAPL version (cached)
 # -----------------------------
 @st.cache_resource
-def get_collection():
+def get_partitions():
     client = chromadb.PersistentClient(path=CFG["persist_dir"])
-    return client.get_collection(CFG["collection_name"])
-col = get_collection()
+    return PartitionCache(client, CFG["persist_dir"], CFG["collection_name"],
+                          capacity=CFG["max_loaded_versions"], compact_dir=CFG["compact_dir"])
+
+@st.cache_resource
+def get_renderer():
+    return PageRenderer(CFG["render_cache_dir"], CFG["render_cache_mb"])
+
+@st.cache_data(show_spinner=False)
+def registration_groups(version: str, stamp=None):
+    # ``stamp`` is the alias record's stamp: a re-ingest or promotion changes it and refreshes the list
+    try:
+        with get_partitions().lease(version) as (col, where):
+            metas = col.get(where=where, include=["metadatas"])["metadatas"]
+    except KeyError:  # not ingested yet
+        return []
+    return sorted({m.get("registration_group") for m in metas if m.get("registration_group")})
 
-def retrieve(query: str, version: str, top_k: int = 12):
-    res = col.query(query_texts=[query], n_results=top_k, where={"papl_version": version})
+def retrieve(query: str, version: str, top_k: int = 12, filters=None):
+    # Filters are pushed into the vector query, so only matching chunks are searched
+    with get_partitions().lease(version) as (col, where):
+        res = col.query(query_texts=[query], n_results=top_k, where=where_clause(where, filters))
     docs = res.get("documents", [[]])[0]
     metas = res.get("metadatas", [[]])[0]
     dists = res.get("distances", [[]])[0] or res.get("embeddings", [[]])[0]
@@ -182,6 +210,7 @@ def retrieve(query: str, version: str, top_k: int = 12):
             "page": m.get("page"),
             "section": m.get("section_title", ""),
             "clause_ref": m.get("clause_ref", ""),
+            "alt_pages": m.get("alt_pages", ""),
             "papl_version": m.get("papl_version", ""),
             "pdf": m.get("source_pdf_path", ""),
             "full_text": d,
@@ -189,11 +218,28 @@ def retrieve(query: str, version: str, top_k: int = 12):
         })
     return rows
 
+@st.fragment
+def show_page(r, key: str):
+    # A fragment: ticking the box reruns only this box, not retrieval and the LLM call
+    if r["page"] is None:
+        return
+    pdf = source_pdf(r["pdf"], r["papl_version"], {CFG["default_version"]: CFG["pdf_path"]}, CFG["data_dir"])
+    if not pdf:
+        st.warning(f"PDF for PAPL {r['papl_version']} not found, so this page can't be shown.")
+        return
+    if st.checkbox("Show page", key=key):
+        try:
+            png, _ = get_renderer().render(pdf, int(r["page"]), r["full_text"], crop=True)
+            st.image(png, caption=f"p.{r['page']}, cited passage highlighted")
+        except Exception as e:
+            st.warning(f"Page could not be rendered ({e}).")
+
 def answer_with_llm(question: str, ctx_blocks):
     if not oai_client:
         return None
     context_text = "\n\n".join(
-        f"[Source: {m.get('papl_version','?')} {m.get('clause_ref','')} p.{m.get('page','?')}] {t}"
+        f"[Source: {m.get('papl_version','?')} {m.get('clause_ref','')} p.{m.get('page','?')}"
+        + (f"; also p.{m['alt_pages']}" if m.get("alt_pages") else "") + f"] {t}"
         for (t, m) in ctx_blocks
     )
     user = f"Question: {question}\n\nCONTEXT:\n{context_text}\n\nAnswer briefly with citations."
@@ -224,8 +270,11 @@ st.markdown('</div>', unsafe_allow_html=True)
 # toolbar
 st.markdown('<div class="toolbar">', unsafe_allow_html=True)
 q = st.text_input("Ask a question", placeholder="Type your question and press Enter…")
-version = st.selectbox("PAPL version", [CFG["default_version"]], index=0)
+versions = discover_versions("data", CFG["persist_dir"], CFG["collection_name"]) or [CFG["default_version"]]
+version = st.selectbox("PAPL version", versions, index=0)
 category = st.selectbox("Category (optional)", ["All", "Core", "Capacity Building", "Capital"], index=0)
+group = st.selectbox("Registration group (optional)", ["All"] + registration_groups(version, alias_stamp(CFG["persist_dir"])), index=0)
+filters = {"support_purpose": category, "registration_group": group}
 search_clicked = st.button("Search", use_container_width=True)
 st.markdown('</div>', unsafe_allow_html=True)
 st.markdown('</div>', unsafe_allow_html=True)  # end appbar
@@ -236,8 +285,17 @@ st.write("")
 # Retrieval + Answer + Sources
 # -----------------------------
 if q or search_clicked:
-    rows = retrieve(q, version, top_k=CFG["top_k"])
-    if not rows:
+    filtered = any(v != "All" for v in filters.values())
+    # a filtered search covers fewer chunks, so fetch only what the answer uses
+    try:
+        rows = retrieve(q, version, top_k=CFG["ctx_k"] if filtered else CFG["top_k"], filters=filters)
+    except KeyError:
+        rows = None
+    if rows is None:
+        st.warning(f"No index for PAPL {version} yet. Run scripts/ingest_papl.py first.")
+    elif not rows and filtered:
+        st.warning("No passages match these filters. Try 'All', or rebuild the index if it predates category tags.")
+    elif not rows:
         st.warning("No relevant passages found. Try refining your question.")
     else:
         ctx_blocks = [(r["full_text"], r["_meta"]) for r in rows[:CFG["ctx_k"]]]
@@ -252,19 +310,24 @@ if q or search_clicked:
         st.markdown("### Sources")
         colA, colB = st.columns(2)
         for i, r in enumerate(rows[:CFG["ctx_k"]]):
-            link = f"{r['pdf']}#page={r['page']}" if r["pdf"] else ""
             cite = f"(PAPL {r['papl_version']}, p.{r['page']}" + (f", {r['clause_ref']}" if r["clause_ref"] else "") + ")"
+            if r["alt_pages"]:
+                cite += f" · also p.{r['alt_pages']}"
             card_html = f"""
             <div class="result-card">
               <div class="result-head">
                 <span class="cite-chip">#{i+1}</span>
                 <strong>{r['section'] or 'Untitled section'}</strong>
               </div>
-              <div class="small-muted">{cite} &nbsp; <span class="pdf-link">{f'<a href="{link}" target="_blank">Open PDF</a>' if link else ''}</span></div>
+              <div class="small-muted">{cite}</div>
               <div style="margin-top:.5rem;">{r['preview']}</div>
             </div>
             """
-            (colA if i % 2 == 0 else colB).markdown(card_html, unsafe_allow_html=True)
+            col = colA if i % 2 == 0 else colB
+            col.markdown(card_html, unsafe_allow_html=True)
+            # The page image replaces a file:// link that only worked on the server itself
+            with col:
+                show_page(r, key=f"page-{i}-{r['page']}")
 
         with st.expander("Diagnostics (top matches)"):
             st.dataframe(pd.DataFrame(rows)[["rank","score","page","section","clause_ref"]])
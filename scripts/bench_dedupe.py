@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Index size and prompt size with and without near-duplicate merging.
+
+Chunks are read from the JSONL written by chunk_pdf.py (before any merge),
+embedded once with the ingest model, and searched exactly for each gold
+question at the app's context size. For the full set and the merged set it
+reports chunk count, index size (HNSW graph + stored text), average prompt
+tokens, how many context slots per prompt repeat another slot's passage,
+and gold page hit rate (a merged chunk covers its alternate pages too).
+
+    python scripts/bench_dedupe.py --config config.yaml --k 6
+"""
+import argparse, copy, json, os
+
+import numpy as np
+
+from dedupe import SCOPE, clusters, dedupe_records
+from papl_qa import build_prompt
+from tune_hnsw import _covers, _normalise, embed_queries, index_size, load_gold
+
+
+def count_tokens():
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(enc.encode(text))
+    except Exception:  # offline or not installed: ~4 characters per token
+        return lambda text: len(text) // 4
+
+
+def hnsw_bytes(X):
+    import hnswlib
+    index = hnswlib.Index(space="cosine", dim=X.shape[1])
+    index.init_index(max_elements=len(X), M=16, ef_construction=200)
+    index.add_items(X, np.arange(len(X)))
+    return index_size(index)
+
+
+def measure(records, X, questions, Q, gold_pages, k, tokens):
+    """Size and prompt statistics for ``records`` (rows of ``X`` are their embeddings)."""
+    top = np.argsort(-(_normalise(Q) @ _normalise(X).T), axis=1)[:, :k]
+    prompt_tokens, repeats, hits = [], [], []
+    for q, row, pages in zip(questions, top, gold_pages):
+        blocks = [(records[i]["text"], records[i]["metadata"]) for i in row]
+        prompt_tokens.append(tokens(build_prompt(q, blocks)))
+        repeats.append(sum(len(g) - 1 for g in clusters([t for t, _ in blocks])))
+        if pages:
+            hits.append(any(_covers(m, pages) for _, m in blocks))
+    text_bytes = sum(len(r["text"].encode("utf-8")) + len(json.dumps(r["metadata"])) for r in records)
+    return {"chunks": len(records), "index_kb": (hnsw_bytes(X) + text_bytes) / 1024,
+            "prompt_tokens": float(np.mean(prompt_tokens)), "repeat_slots": float(np.mean(repeats)),
+            "gold_hit": float(np.mean(hits)) if hits else float("nan")}
+
+
+def main():
+    import yaml
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--jsonl", help="chunks to measure (default: data/papl_chunks_<papl_version>.jsonl)")
+    ap.add_argument("--gold", default="data/gold_questions.jsonl")
+    ap.add_argument("--k", type=int, default=6, help="passages per prompt (the app sends 6)")
+    ap.add_argument("--threshold", type=float, help="Jaccard threshold (default: dedupe_threshold or 0.8)")
+    ap.add_argument("--across-categories", action="store_true",
+                    help="also merge copies tagged with different categories (breaks category filters)")
+    ap.add_argument("--openai", action="store_true", help="embed with OpenAI, as ingest --openai does")
+    args = ap.parse_args()
+
+    cfg = yaml.safe_load(open(args.config))
+    path = args.jsonl or os.path.join("data", f"papl_chunks_{cfg['papl_version'].replace('/', '-')}.jsonl")
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    threshold = args.threshold or float(cfg.get("dedupe_threshold") or 0.8)
+    scope = ("papl_version",) if args.across_categories else SCOPE
+    merged, dropped = dedupe_records(copy.deepcopy(records), threshold, scope=scope)
+
+    X = embed_queries([r["text"] for r in records], args.openai)
+    questions, gold_pages = load_gold(args.gold)
+    Q = embed_queries(questions, args.openai)
+    row_of = {r["id"]: i for i, r in enumerate(records)}
+    tokens = count_tokens()
+    before = measure(records, X, questions, Q, gold_pages, args.k, tokens)
+    after = measure(merged, X[[row_of[r["id"]] for r in merged]], questions, Q, gold_pages, args.k, tokens)
+
+    print(f"{path}: merged {dropped} near-duplicate chunk(s) at Jaccard >= {threshold}; "
+          f"{len(questions)} questions, {args.k} passages each")
+    print(f"{'':8} {'chunks':>7} {'index KB':>9} {'prompt tok':>11} {'repeats':>8} {'gold hit':>9}")
+    for label, m in (("before", before), ("after", after)):
+        print(f"{label:8} {m['chunks']:>7} {m['index_kb']:>9.1f} {m['prompt_tokens']:>11.1f} "
+              f"{m['repeat_slots']:>8.2f} {m['gold_hit']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""Benchmark PDF extraction backends: pages/sec, peak memory, text quality vs PyPDF2.
+
+Each backend runs in a fresh process so peak RSS is not polluted by the
+others. Quality is the word-level similarity to PyPDF2's output plus counts
+of the artefacts PyPDF2 is known for (split years such as "2025 -26", stray
+spaces before punctuation).
+
+    python scripts/bench_extract.py --pdf data/NDIS_PAPL_2025-26.pdf
+"""
+import argparse, difflib, multiprocessing as mp, pathlib, re, resource, sys, time, tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+from pdf_extract import EXTRACTORS, get_extractor
+from page_cache import normalise_page
+
+ARTEFACTS = {
+    "split_year": re.compile(r"\b\d{4} -\d{2}\b"),
+    "space_before_punct": re.compile(r"\w \s*[,.;:)]"),
+}
+
+
+def _run(name, pdf_path, repeat, py_heap):
+    fn = get_extractor(name)
+    base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        pages = fn(pdf_path)
+    secs = (time.perf_counter() - t0) / repeat
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    py_peak = float("nan")
+    if py_heap:
+        # separate untimed pass: tracemalloc slows pure-Python parsers ~15x
+        tracemalloc.start()
+        fn(pdf_path)
+        _, py_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"pages": len(pages), "secs": secs, "py_peak_mb": py_peak / 2**20,
+            "rss_peak_mb": rss_kb / 1024, "rss_growth_mb": (rss_kb - base_kb) / 1024,
+            "text": [normalise_page(p) for p in pages]}
+
+
+def measure(name, pdf_path, repeat, py_heap=False):
+    with mp.get_context("spawn").Pool(1) as pool:
+        return pool.apply(_run, (name, pdf_path, repeat, py_heap))
+
+
+def _matchers(pages, ref_pages):
+    for page, ref in zip(pages, ref_pages):
+        yield difflib.SequenceMatcher(None, ref.split(), page.split(), autojunk=False)
+
+
+def quality(pages, ref_pages):
+    """Word-level similarity to the reference, page by page, weighted by length."""
+    total = matched = 0
+    for sm in _matchers(pages, ref_pages):
+        total += len(sm.a) + len(sm.b)
+        matched += 2 * sum(b.size for b in sm.get_matching_blocks())
+    text = "\n".join(pages)
+    counts = {k: len(p.findall(text)) for k, p in ARTEFACTS.items()}
+    return (matched / total if total else 0.0), counts
+
+
+def sample_diff(pages, ref_pages, n=5):
+    out = []
+    for sm in _matchers(pages, ref_pages):
+        for tag, i1, i2, j1, j2 in sm.get_opcodes():
+            if tag != "equal":
+                out.append(f"  {' '.join(sm.a[i1:i2])[:60]!r} -> {' '.join(sm.b[j1:j2])[:60]!r}")
+                if len(out) >= n:
+                    return out
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pdf", default="data/NDIS_PAPL_2025-26.pdf")
+    ap.add_argument("--backends", default=",".join(EXTRACTORS))
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--py-heap", action="store_true", help="also report tracemalloc peak (slow)")
+    ap.add_argument("--show-diff", type=int, default=0, help="print N sample differences vs pypdf2")
+    args = ap.parse_args()
+
+    results = {}
+    for name in ["pypdf2"] + [b for b in args.backends.split(",") if b != "pypdf2"]:
+        try:
+            results[name] = measure(name, args.pdf, args.repeat, args.py_heap)
+        except (ImportError, ValueError) as e:
+            print(f"skip {name}: {e}", file=sys.stderr)
+    if "pypdf2" not in results:
+        sys.exit("pypdf2 is required as the quality reference")
+
+    ref = results["pypdf2"]["text"]
+    print(f"{'backend':<10} {'pages/s':>8} {'secs':>7} {'rss MB':>7} {'+rss MB':>8} {'py MB':>6} "
+          f"{'sim':>6} " + " ".join(f"{k:>18}" for k in ARTEFACTS))
+    for name, r in results.items():
+        ratio, counts = quality(r["text"], ref)
+        print(f"{name:<10} {r['pages'] / r['secs']:>8.1f} {r['secs']:>7.2f} {r['rss_peak_mb']:>7.1f} "
+              f"{r['rss_growth_mb']:>8.1f} {r['py_peak_mb']:>6.1f} {ratio:>6.3f} "
+              + " ".join(f"{counts[k]:>18}" for k in ARTEFACTS))
+        if args.show_diff and name != "pypdf2":
+            print("\n".join(sample_diff(r["text"], ref, args.show_diff)))
+
+
+if __name__ == "__main__":
+    main()
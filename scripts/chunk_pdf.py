@@ -1,11 +1,24 @@
 #!/usr/bin/env python
 import argparse, pathlib, yaml, json, re, csv
+from bisect import bisect_right
+from collections import defaultdict
+from os.path import commonprefix
 from PyPDF2 import PdfReader
+from pdf_extract import DEFAULT_EXTRACTOR, extract_page_texts
+from price_tables import parse_price_rows, write_price_db
+from pdf_structure import PageRanges, SectionIndex, detect_headings, locate_headings
+from support_categories import CategoryIndex, parse_registration_groups, tag_chunk
 
 def normalise_ws(text: str) -> str:
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
+def _cut(window: str, chunk_chars: int) -> int:
+    cut = window.rfind(". ")
+    if cut == -1 or cut < chunk_chars * 0.6:
+        cut = len(window)
+    return cut
+
 def split_chunks(text: str, chunk_chars: int, overlap: int):
     if chunk_chars <= 0:
         return [text]
@@ -13,9 +26,7 @@ def split_chunks(text: str, chunk_chars: int, overlap: int):
     while start < n:
         end = min(n, start + chunk_chars)
         window = text[start:end]
-        cut = window.rfind(". ")
-        if cut == -1 or cut < chunk_chars * 0.6:
-            cut = len(window)
+        cut = _cut(window, chunk_chars)
         piece = window[:cut].strip()
         if piece:
             chunks.append(piece)
@@ -23,9 +34,180 @@ def split_chunks(text: str, chunk_chars: int, overlap: int):
         start = max(0, start + cut - overlap)
     return chunks
 
+# ---- Repeated header/footer detection ----
+# Running headers vary only in their digits ("Page 7 of 103"), and PyPDF2 often glues
+# the first body line onto them, so we learn boilerplate as line *prefixes*.
+
+def _template(line: str) -> str:
+    return re.sub(r'\d+', '#', normalise_ws(line))
+
+def _edge_lines(text: str, edge_lines: int):
+    lines = [l for l in text.splitlines() if l.strip()]
+    return lines[:edge_lines] + lines[-edge_lines:]
+
+def _template_regex(tpl: str):
+    parts = []
+    for ch in tpl:
+        if ch == '#':
+            parts.append(r'\d+')
+        elif ch == ' ':
+            parts.append(r'\s*')
+        else:
+            parts.append(re.escape(ch))
+    return re.compile(r'\s*' + ''.join(parts) + r'\s*')
+
+def detect_boilerplate(page_texts, edge_lines: int = 3, min_ratio: float = 0.5, key_chars: int = 24):
+    """Return regexes for line prefixes repeated at the top/bottom of most pages."""
+    pages = [t for t in page_texts if t and t.strip()]
+    if len(pages) < 3:
+        return []
+    groups = defaultdict(dict)  # template key -> {page index: template}
+    for i, text in enumerate(pages):
+        for line in _edge_lines(text, edge_lines):
+            tpl = _template(line)
+            if len(tpl) >= 8:
+                groups[tpl[:key_chars]].setdefault(i, tpl)
+    patterns = []
+    for key, by_page in groups.items():
+        if len(by_page) < min_ratio * len(pages):
+            continue
+        prefix = commonprefix(list(by_page.values()))
+        if prefix not in by_page.values():
+            prefix = prefix[:prefix.rfind(' ')] if ' ' in prefix else prefix
+        prefix = prefix.strip()
+        if len(prefix) >= 8:
+            patterns.append(_template_regex(prefix))
+    return patterns
+
+def _header_hit(lines, patterns, edge_lines):
+    """Index of the first top-edge line that starts with boilerplate, else -1."""
+    for i in range(min(edge_lines, len(lines))):
+        if any(pat.match(lines[i]) for pat in patterns):
+            return i
+    return -1
+
+def running_headers(page_texts, patterns, edge_lines: int = 3):
+    """Lines printed above the page header, i.e. the running chapter title."""
+    titles = []
+    for text in page_texts:
+        lines = [l for l in (text or "").splitlines() if l.strip()]
+        hit = _header_hit(lines, patterns, edge_lines)
+        titles.extend(normalise_ws(l) for l in lines[:max(0, hit)])
+    return titles
+
+def strip_boilerplate(text: str, patterns, edge_lines: int = 3) -> str:
+    if not patterns or not text:
+        return text
+    lines = [l for l in text.splitlines() if l.strip()]
+    # the running chapter title above the header is recorded as section_title instead
+    lines = lines[max(0, _header_hit(lines, patterns, edge_lines)):]
+    edges = set(range(min(edge_lines, len(lines)))) | set(range(max(0, len(lines) - edge_lines), len(lines)))
+    for i in edges:
+        for pat in patterns:
+            m = pat.match(lines[i])
+            if m:
+                lines[i] = lines[i][m.end():]
+                break
+    return "\n".join(lines)
+
+# ---- Whole-document streaming chunker ----
+
+def stream_chunks(pages, chunk_chars: int, overlap: int, breaks=()):
+    """Chunk an iterable of (page_no, text) as one stream.
+
+    Yields (piece, page_start, page_end, offset) so clauses that run over a page
+    break stay in one chunk. ``breaks`` are sorted stream offsets of headings:
+    a window is cut at the last heading inside it (without overlap) in
+    preference to a sentence end, so chunks line up with clauses. Only the
+    unchunked tail of the stream is held in memory.
+    """
+    buf, buf_start = "", 0       # buf == stream[buf_start:]
+    starts, nums = [], []        # stream offset at which each page begins
+    breaks = list(breaks)
+
+    def page_at(offset):
+        return nums[max(0, bisect_right(starts, offset) - 1)]
+
+    def take(final):
+        nonlocal buf, buf_start
+        while buf and (final or 0 < chunk_chars <= len(buf)):
+            window = buf[:chunk_chars] if chunk_chars > 0 else buf
+            last = final and len(buf) <= len(window)
+            cut = len(window) if last else _cut(window, chunk_chars)
+            # last heading strictly inside the window (but not right at its start)
+            j = bisect_right(breaks, buf_start + len(window) - 1) - 1
+            at_heading = j >= 0 and breaks[j] > buf_start + chunk_chars * 0.3
+            if at_heading:
+                cut = breaks[j] - buf_start
+            piece = window[:cut].strip()
+            if piece:
+                yield piece, page_at(buf_start), page_at(buf_start + cut - 1), buf_start
+            if last and not at_heading:
+                buf_start += len(buf); buf = ""
+                return
+            step = cut if at_heading else max(1, cut - overlap)
+            buf, buf_start = buf[step:], buf_start + step
+
+    for page_no, text in pages:
+        if not text:
+            continue
+        if buf:
+            buf += " "
+        starts.append(buf_start + len(buf)); nums.append(page_no)
+        buf += text
+        yield from take(final=False)
+    yield from take(final=True)
+
+def analyse_layout(page_texts, reader=None):
+    """Boilerplate patterns and headings for a document, as used by build_records."""
+    patterns = detect_boilerplate(page_texts)
+    headings = detect_headings(reader, [strip_boilerplate(t, patterns) for t in page_texts],
+                               top_level=running_headers(page_texts, patterns))
+    return patterns, headings
+
+def build_records(page_texts, version: str, pdf_path: str, chunk_chars: int, overlap: int,
+                  max_chunks: int = 0, section_of=None, patterns=None, headings=None):
+    """Chunk raw per-page text into JSONL records (boilerplate stripped, cross-page).
+
+    ``headings`` (pdf_structure.Heading) fill section_title/clause_ref and align
+    chunk boundaries to clauses; ``section_of(page)`` overrides section_title.
+    Chunks are also tagged with support purpose/category and registration group.
+    """
+    if patterns is None:
+        patterns = detect_boilerplate(page_texts)
+    page_lines, page_offsets, pages, pos = {}, {}, [], 0
+    for i, raw in enumerate(page_texts):
+        lines = [normalise_ws(l) for l in strip_boilerplate(raw or "", patterns).splitlines() if l.strip()]
+        text = " ".join(lines)
+        if not text:
+            continue
+        page_lines[i + 1], page_offsets[i + 1] = lines, pos
+        pages.append((i + 1, text))
+        pos += len(text) + 1
+    placed = locate_headings(headings or [], page_lines, page_offsets)
+    index, chapters = SectionIndex(placed), CategoryIndex(placed)
+    groups = parse_registration_groups(page_texts)
+
+    per_page = defaultdict(int)
+    chunks = stream_chunks(pages, chunk_chars, overlap, breaks=index.offsets)
+    for doc_id, (piece, p0, p1, off) in enumerate(chunks):
+        if max_chunks and doc_id >= max_chunks:
+            break
+        anchor = off + min(len(piece) // 3, 200)
+        section, clause = index.lookup(anchor)
+        if section_of is not None:
+            section = section_of(p0) or section
+        per_page[p0] += 1
+        meta = {"papl_version": version, "page": p0, "page_start": p0, "page_end": p1,
+                "section_title": section, "clause_ref": clause,
+                "source_pdf_path": str(pdf_path).replace("\\","/"),
+                **tag_chunk(piece, chapters.lookup(anchor), groups, (clause, section))}
+        yield {"id": f"p{p0}_c{per_page[p0]}_{doc_id}", "text": piece, "metadata": meta}
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", required=True)
+    ap.add_argument("--no-cache", action="store_true", help="re-extract page text even if cached")
     args = ap.parse_args()
     cfg = yaml.safe_load(open(args.config))
 
@@ -42,33 +224,45 @@ def main():
             for row in csv.DictReader(f):
                 ranges.append((int(row["start_page"]), int(row["end_page"]), row["section_title"]))
 
-    def page_section(p):
-        for s, e, title in ranges:
-            if s <= p <= e:
-                return title
-        return ""
+    page_section = PageRanges(ranges) if ranges else None
+
+    cache_dir = None if args.no_cache else cfg.get("page_cache_dir")
+    page_texts = extract_page_texts(pdf_path, cfg.get("extractor", DEFAULT_EXTRACTOR), cache_dir)
+    reader = PdfReader(str(pdf_path))  # outline only; parsing is lazy
+    patterns, headings = analyse_layout(page_texts, reader)
 
-    reader = PdfReader(str(pdf_path))
-    total_pages = len(reader.pages)
+    # Baseline: the old per-page chunking, for the size report below
+    base_chunks = [c for raw in page_texts if normalise_ws(raw)
+                   for c in split_chunks(normalise_ws(raw), chunk_chars, overlap)]
+    raw_chars = sum(len(normalise_ws(t)) for t in page_texts)
+    body_chars = sum(len(normalise_ws(strip_boilerplate(t, patterns))) for t in page_texts)
 
+    n_chunks = n_chars = 0
     with open(out_path, "w", encoding="utf-8") as w:
-        doc_id = 0
-        for i in range(total_pages):
-            raw = reader.pages[i].extract_text() or ""
-            txt = normalise_ws(raw)
-            if not txt:
-                continue
-            for j, piece in enumerate(split_chunks(txt, chunk_chars, overlap), start=1):
-                meta = {"papl_version": cfg["papl_version"], "page": i+1,
-                        "section_title": page_section(i+1), "clause_ref": "",
-                        "source_pdf_path": str(pdf_path).replace("\\","/")}
-                rec = {"id": f"p{i+1}_c{j}_{doc_id}", "text": piece, "metadata": meta}
-                w.write(json.dumps(rec, ensure_ascii=False) + "\n")
-                doc_id += 1
-                if max_chunks and doc_id >= max_chunks:
-                    break
-            if max_chunks and doc_id >= max_chunks: break
+        for rec in build_records(page_texts, cfg["papl_version"], pdf_path, chunk_chars, overlap,
+                                 max_chunks=max_chunks, section_of=page_section, patterns=patterns,
+                                 headings=headings):
+            w.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n_chunks += 1; n_chars += len(rec["text"])
     print(f"Wrote chunks to {out_path}")
 
+    price_db = cfg.get("price_db") or ""
+    if price_db:
+        version = cfg["papl_version"]
+        rows = parse_price_rows([strip_boilerplate(t, patterns) for t in page_texts], version)
+        parquet = pathlib.Path(price_db).with_name(f"papl_prices_{version.replace('/','-')}.parquet")
+        write_price_db(price_db, version, rows, parquet_path=str(parquet))
+        print(f"Wrote {len(rows)} price rows ({len({r['item_number'] for r in rows})} items) "
+              f"to {price_db} and {parquet}")
+
+    def _delta(a, b):
+        return f"{a} -> {b} ({(b - a) / max(1, a):+.1%})"
+
+    print(f"Located {len(headings)} heading(s) for section_title/clause_ref")
+    print(f"Stripped {len(patterns)} boilerplate pattern(s); document text chars: {_delta(raw_chars, body_chars)}")
+    if not max_chunks and base_chunks:
+        print(f"vs per-page chunking: chunks {_delta(len(base_chunks), n_chunks)}; "
+              f"chunk chars incl. overlap {_delta(sum(len(c) for c in base_chunks), n_chars)}")
+
 if __name__ == "__main__":
     main()
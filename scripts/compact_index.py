@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+"""Compact quantised snapshots of index generations, for small containers.
+
+A Chroma generation keeps every embedding as float32 twice (the HNSW graph
+and the SQLite log) and loads the graph into memory when queried. A compact
+snapshot is a directory next to it, named after the generation, with:
+
+- ``codes.npy``: the unit-normalised embeddings as float16, or as int8 with
+  one scale per vector (``scale.npy``);
+- ``full.npy``: the float32 embeddings, never loaded; only the rows being
+  rescored are read from disk (omit it with ``rescore=False`` for the
+  smallest snapshot);
+- ``records.jsonl``: ids, documents and metadata (documents are read from
+  disk only for the results returned).
+
+``CompactPartition.query`` scores every chunk against the codes (a PAPL
+edition is a few thousand chunks at most, so an exact scan is cheaper than a
+graph), rescores the best ``rescore_k`` in float32, and returns the same
+shape of result as ``Collection.query`` with cosine distances.
+``PartitionCache(compact_dir=...)`` serves from a snapshot whenever one
+exists for the live generation.
+
+    python scripts/compact_index.py --config config.yaml --dtype int8
+    python scripts/compact_index.py --config config.yaml --bench --k 6
+"""
+import argparse, json, os, shutil, statistics, subprocess, sys, tempfile, time
+
+import numpy as np
+
+DTYPES = ("int8", "float16")
+BLOCK = 512  # rows converted to float32 per matmul, to bound the temporaries
+
+
+def quantise(X, dtype: str):
+    """(codes, per-vector scale or None) for unit-normalised float32 rows."""
+    if dtype == "float16":
+        return X.astype(np.float16), None
+    if dtype != "int8":
+        raise ValueError(f"compact dtype must be one of {', '.join(DTYPES)}, not {dtype!r}")
+    scale = np.maximum(np.abs(X).max(axis=1), 1e-12) / 127.0
+    return np.round(X / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+
+
+def _unit(X):
+    X = np.asarray(X, dtype=np.float32)
+    return X / np.maximum(np.linalg.norm(X, axis=-1, keepdims=True), 1e-12)
+
+
+def export_compact(col, out_dir: str, dtype: str = "int8", rescore: bool = True):
+    """Write a snapshot of ``col`` to ``out_dir``; returns its size in bytes."""
+    got = col.get(include=["embeddings", "documents", "metadatas"])
+    X = _unit(got["embeddings"])
+    codes, scale = quantise(X, dtype)
+    tmp = out_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "codes.npy"), codes)
+    if scale is not None:
+        np.save(os.path.join(tmp, "scale.npy"), scale)
+    if rescore:
+        np.save(os.path.join(tmp, "full.npy"), X)
+    with open(os.path.join(tmp, "records.jsonl"), "w", encoding="utf-8") as f:
+        for i, d, m in zip(got["ids"], got["documents"], got["metadatas"]):
+            f.write(json.dumps({"id": i, "text": d, "metadata": m}, ensure_ascii=False) + "\n")
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)  # readers never see a half-written snapshot
+    return dir_size(out_dir)
+
+
+def drop_snapshots(compact_dir: str, names):
+    """Remove the snapshots of garbage-collected generations."""
+    for name in names:
+        shutil.rmtree(os.path.join(compact_dir, name), ignore_errors=True)
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs)
+
+
+def matches(meta, where) -> bool:
+    """Evaluate the subset of Chroma ``where`` syntax built by papl_qa.where_clause."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            (op, value), = cond.items()
+            v = meta.get(key)
+            ok = {"$eq": lambda: v == value, "$ne": lambda: v != value,
+                  "$in": lambda: v in value, "$nin": lambda: v not in value}.get(op)
+            if ok is None:
+                raise ValueError(f"unsupported where operator {op!r} in a compact partition")
+            if not ok():
+                return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+class _RowReader:
+    """Reads single rows of a 2-d float32 .npy file with pread, so they are not kept in memory.
+
+    A memory map would do the same, but the kernel's read-ahead leaves most of
+    the file resident and counted in RSS.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            version = np.lib.format.read_magic(f)
+            read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                           else np.lib.format.read_array_header_2_0)
+            shape, _, _ = read_header(f)
+            self.offset = f.tell()
+        self.dim = shape[1]
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def rows(self, rows):
+        size = self.dim * 4
+        return np.stack([np.frombuffer(os.pread(self.fd, size, self.offset + int(i) * size), dtype=np.float32)
+                         for i in rows]) if len(rows) else np.empty((0, self.dim), dtype=np.float32)
+
+    def __del__(self):
+        try:
+            os.close(self.fd)
+        except (AttributeError, OSError):
+            pass
+
+
+class CompactPartition:
+    """Read-only, quantised stand-in for a Chroma collection (``query`` and ``get``)."""
+
+    def __init__(self, path: str, embedding_function=None, rescore_k: int = 50):
+        self.path, self.id, self.name = path, path, os.path.basename(path.rstrip("/"))
+        self.rescore_k = rescore_k
+        self.codes = np.load(os.path.join(path, "codes.npy"))
+        scale = os.path.join(path, "scale.npy")
+        self.scale = np.load(scale) if os.path.exists(scale) else None
+        full = os.path.join(path, "full.npy")
+        self.full = _RowReader(full) if os.path.exists(full) else None
+        self.ids, self.metadatas, self._offsets = [], [], []
+        self._records = os.path.join(path, "records.jsonl")
+        with open(self._records, "rb") as f:
+            for line in iter(f.readline, b""):
+                rec = json.loads(line)
+                self._offsets.append(f.tell() - len(line))
+                self.ids.append(rec["id"]); self.metadatas.append(rec["metadata"])
+        self._ef = embedding_function
+
+    def _documents(self, rows):
+        with open(self._records, "rb") as f:
+            out = []
+            for i in rows:
+                f.seek(self._offsets[i])
+                out.append(json.loads(f.readline())["text"])
+            return out
+
+    def count(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        """Resident bytes of the vectors (the float32 store stays on disk)."""
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def _vectors(self, rows):
+        """float32 vectors for ``rows``: exact if the snapshot has them, else dequantised."""
+        if self.full is not None:
+            return self.full.rows(rows)
+        codes = self.codes[rows].astype(np.float32)
+        return codes * self.scale[rows, None] if self.scale is not None else codes
+
+    def _approx(self, Q, rows):
+        every = rows is None
+        n = len(self.ids) if every else len(rows)
+        out = np.empty((len(Q), n), dtype=np.float32)
+        for s in range(0, n, BLOCK):
+            codes = self.codes[s:s + BLOCK] if every else self.codes[rows[s:s + BLOCK]]
+            out[:, s:s + BLOCK] = Q @ codes.astype(np.float32).T
+        if self.scale is not None:
+            out *= self.scale if every else self.scale[rows]
+        return out
+
+    def query(self, query_embeddings=None, query_texts=None, n_results: int = 10, where=None,
+              include=("documents", "metadatas", "distances"), **_):
+        if query_embeddings is None:
+            if self._ef is None:
+                from chromadb.utils import embedding_functions
+                self._ef = embedding_functions.DefaultEmbeddingFunction()
+            query_embeddings = self._ef(list(query_texts))
+        Q = _unit(np.atleast_2d(query_embeddings))
+        rows = np.arange(len(self.ids)) if not where else \
+            np.array([i for i, m in enumerate(self.metadatas) if matches(m, where)], dtype=np.int64)
+        res = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if "embeddings" in include:
+            res["embeddings"] = []
+        if not len(rows):
+            for key in res:
+                res[key] = [[] for _ in Q]
+            return res
+        approx = self._approx(Q, None if not where else rows)
+        k = min(n_results, len(rows))
+        for q, scores in zip(Q, approx):
+            pool = np.argsort(-scores)[: max(k, self.rescore_k) if self.full is not None else k]
+            if self.full is not None:
+                picked = np.sort(rows[pool])
+                exact = self.full.rows(picked) @ q
+                order = np.argsort(-exact)[:k]
+                top, sims = picked[order], exact[order]
+            else:
+                top, sims = rows[pool], scores[pool]
+            res["ids"].append([self.ids[i] for i in top])
+            res["documents"].append(self._documents(top))
+            res["metadatas"].append([self.metadatas[i] for i in top])
+            res["distances"].append([float(1.0 - s) for s in sims])
+            if "embeddings" in include:
+                res["embeddings"].append(self._vectors(np.asarray(top, dtype=np.int64)).tolist())
+        return res
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas"), **_):
+        wanted = set(ids) if ids is not None else None
+        rows = [i for i, (cid, m) in enumerate(zip(self.ids, self.metadatas))
+                if (wanted is None or cid in wanted) and matches(m, where)]
+        out = {"ids": [self.ids[i] for i in rows], "metadatas": [self.metadatas[i] for i in rows]}
+        if "documents" in include:
+            out["documents"] = self._documents(rows)
+        if "embeddings" in include:
+            out["embeddings"] = self._vectors(rows).tolist()
+        return out
+
+
+# ---- Benchmark: each variant is loaded in a fresh process so RSS is comparable ----
+
+def _probe(kind, persist_dir, name, snapshot, queries_path, k):
+    import chromadb  # imported by both variants, so only the index itself is measured
+    from papl_collections import rss_mb
+    Q = np.load(queries_path)
+    base = rss_mb()
+    if kind == "chroma":
+        col = chromadb.PersistentClient(path=persist_dir).get_collection(name)
+    else:
+        col = CompactPartition(snapshot)
+    col.query(query_embeddings=Q[:1].tolist(), n_results=k)  # load / page in
+    lat, ids = [], []
+    for q in Q:
+        t0 = time.perf_counter()
+        res = col.query(query_embeddings=[q.tolist()], n_results=k)
+        lat.append((time.perf_counter() - t0) * 1000)
+        ids.append(res["ids"][0])
+    print(json.dumps({"rss_mb": rss_mb() - base, "lat": lat, "ids": ids}))
+
+
+def _run_probe(*args):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--probe", *map(str, args)],
+                         capture_output=True, text=True)
+    if out.returncode:
+        raise RuntimeError(f"benchmark probe {args[0]} failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def bench(client, name, Q, k: int = 6):
+    """Rows of {variant, disk_mb, rss_mb, p50_ms, p95_ms, recall} against exact float32 search.
+
+    The generation is copied into an empty Chroma store first, so its disk
+    size is not mixed up with other generations in the same SQLite file.
+    """
+    import chromadb
+    col = client.get_collection(name)
+    got = col.get(include=["embeddings", "documents", "metadatas"])
+    X, ids = _unit(got["embeddings"]), got["ids"]
+    truth = [{ids[i] for i in row} for row in np.argsort(-(_unit(Q) @ X.T), axis=1)[:, :k]]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = os.path.join(tmp, "chroma")
+        copy = chromadb.PersistentClient(path=store).create_collection(name, metadata=col.metadata)
+        for i in range(0, len(ids), 256):
+            copy.add(ids=ids[i:i + 256], embeddings=got["embeddings"][i:i + 256],
+                     documents=got["documents"][i:i + 256], metadatas=got["metadatas"][i:i + 256])
+        qpath = os.path.join(tmp, "q.npy")
+        np.save(qpath, Q.astype(np.float32))
+        variants = [("chroma float32 (HNSW)", "chroma", None, dir_size(store))]
+        for dtype in DTYPES:
+            for rescore in (True, False):
+                snap = os.path.join(tmp, f"{dtype}-{rescore}")
+                size = export_compact(col, snap, dtype, rescore)
+                variants.append((f"{dtype}" + (" + f32 rescore" if rescore else ""), "compact", snap, size))
+        for label, kind, snap, size in variants:
+            r = _run_probe(kind, store, name, snap or "-", qpath, k)
+            lat = sorted(r["lat"])
+            rows.append({"variant": label, "disk_mb": size / 2**20, "rss_mb": r["rss_mb"],
+                         "p50_ms": statistics.median(lat), "p95_ms": lat[min(len(lat) - 1, int(0.95 * len(lat)))],
+                         "recall": float(np.mean([len(set(a) & t) / k for a, t in zip(r["ids"], truth)]))})
+    return rows
+
+
+def main():
+    import yaml
+    if len(sys.argv) > 1 and sys.argv[1] == "--probe":
+        kind, persist_dir, name, snapshot, queries_path, k = sys.argv[2:8]
+        return _probe(kind, persist_dir, name, snapshot, queries_path, int(k))
+
+    import chromadb
+    from papl_collections import resolve_partition
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--version", help="PAPL edition (default: papl_version)")
+    ap.add_argument("--dtype", choices=DTYPES, help="default: compact_embeddings in the config, else int8")
+    ap.add_argument("--no-rescore", action="store_true", help="omit the float32 rescoring store")
+    ap.add_argument("--bench", action="store_true", help="compare against the Chroma index instead of exporting")
+    ap.add_argument("--gold", default="data/gold_questions.jsonl", help="queries for --bench")
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--openai", action="store_true", help="index was built with OpenAI embeddings")
+    args = ap.parse_args()
+
+    cfg = yaml.safe_load(open(args.config))
+    persist_dir = cfg.get("persist_dir", "data/chroma")
+    version = args.version or cfg["papl_version"]
+    client = chromadb.PersistentClient(path=persist_dir)
+    name, _ = resolve_partition(client, persist_dir, cfg.get("collection_name", "papl_chunks"), version)
+
+    if args.bench:
+        from tune_hnsw import embed_queries, load_gold
+        Q = embed_queries(load_gold(args.gold)[0], args.openai)
+        print(f"PAPL {version} ('{name}'), {len(Q)} queries, recall@{args.k} vs exact float32 search")
+        print(f"{'variant':<24} {'disk MB':>8} {'RSS MB':>7} {'p50 ms':>7} {'p95 ms':>7} {'recall':>7}")
+        for r in bench(client, name, Q, args.k):
+            print(f"{r['variant']:<24} {r['disk_mb']:>8.2f} {r['rss_mb']:>7.1f} {r['p50_ms']:>7.3f} "
+                  f"{r['p95_ms']:>7.3f} {r['recall']:>7.3f}")
+        return
+
+    dtype = args.dtype or cfg.get("compact_embeddings") or "int8"
+    out = os.path.join(cfg.get("compact_dir", "data/compact"), name)
+    size = export_compact(client.get_collection(name), out, dtype, rescore=not args.no_rescore)
+    print(f"Wrote {dtype} snapshot of '{name}' to {out} ({size / 2**20:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
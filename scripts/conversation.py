@@ -0,0 +1,153 @@
+"""Conversation mode: follow-up questions reuse the chunks already retrieved.
+
+A ``Conversation`` (one per Streamlit session and edition) keeps the last few
+turns and a pool of the chunks they retrieved, with their unit embeddings.
+Each new question is embedded once. A follow-up must lean on the previous
+turn: it opens with a connective ("and in remote areas?", "what about level
+3?") or refers back with a pronoun or demonstrative ("does that apply to
+SIL?"), and adds at most ``MAX_NEW_WORDS`` content words of its own. It has
+the previous question's vector blended in, so it keeps the topic, and is
+answered by re-ranking the pool by cosine. The index is only searched when
+the pool's best matches, scored against the follow-up's own (unblended)
+vector, average below ``reuse_ratio`` of what the index returned for the
+question that filled it (both over the top ``followup_ctx_k``), i.e. when
+the conversation has moved on. Standalone questions always search the
+index. Follow-ups send the model fewer passages (``followup_ctx_k``) plus
+the previous question and a clipped answer, instead of a fresh full
+context. The conversation starts over when the edition's alias moves to
+another generation, since the pooled chunks belong to the old one.
+
+Nothing here imports Streamlit; the app keeps the object in session state.
+"""
+import re, time
+from collections import OrderedDict
+
+import numpy as np
+
+from compact_index import matches
+from papl_qa import result_rows, where_clause
+
+CONNECTIVE = re.compile(r"^\s*(and|but|also|what about|how about|what if|same for|same with|then what)\b", re.I)
+ANAPHOR = re.compile(r"\b(it|its|that|this|those|these|they|them|their|same)\b", re.I)
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = set("""a an and are as at be but by can do does for from how i if in is it its of on or so that the
+their them then there these they this those to was were what when where which who why will with without
+also about same apply applies any there's what's""".split())
+MAX_NEW_WORDS = 3  # content words a follow-up may add beyond the previous question's
+MAX_ANSWER_CHARS = 400  # of the previous answer, repeated to the model for context
+
+
+def _unit(v):
+    v = np.asarray(v, dtype=np.float32)
+    return v / max(float(np.linalg.norm(v)), 1e-12)
+
+
+def query_embedder(partitions):
+    """The embedding function the partitions' collections use for query text."""
+    ef = partitions.collection_kwargs.get("embedding_function")
+    if ef is None:
+        from chromadb.utils import embedding_functions
+        ef = embedding_functions.DefaultEmbeddingFunction()
+    return ef
+
+
+class Conversation:
+    """Turn history plus an LRU pool of retrieved rows and their embeddings for one edition."""
+
+    def __init__(self, version: str, pool_size: int = 48, turns: int = 3, reuse_ratio: float = 0.9,
+                 blend: float = 0.5, followup_ctx_k: int = 4):
+        self.version = version
+        self.pool_size, self.max_turns = pool_size, turns
+        self.reuse_ratio, self.blend, self.followup_ctx_k = reuse_ratio, blend, followup_ctx_k
+        self.turns = []  # {"question", "answer", "vector", "source"}
+        self.pool = OrderedDict()  # chunk id -> (row, unit embedding)
+        self.ref_score = 0.0  # mean top-followup_ctx_k cosine of the last index search
+        self.generation = None  # generation the pool was retrieved from
+
+    def is_followup(self, question: str) -> bool:
+        """Connective opening or back-reference, and no new topic of its own."""
+        if not self.turns or not (CONNECTIVE.match(question) or ANAPHOR.search(question)):
+            return False
+        seen = set(WORD.findall(self.turns[-1]["question"].lower()))
+        new = [w for w in WORD.findall(question.lower()) if w not in STOPWORDS and w not in seen]
+        return len(new) <= MAX_NEW_WORDS
+
+    def history(self):
+        """[(question, clipped answer)] for the latest turn, for the prompt."""
+        if not self.turns:
+            return []
+        last = self.turns[-1]
+        answer = (last["answer"] or "").strip()
+        if len(answer) > MAX_ANSWER_CHARS:
+            answer = answer[:MAX_ANSWER_CHARS].rsplit(" ", 1)[0] + "…"
+        return [(last["question"], answer)] if answer else [(last["question"], "(no answer)")]
+
+    def _pool_rank(self, q, q_own, where, k):
+        """Pool rows ranked by ``q``; the score is the top k's mean cosine to ``q_own``."""
+        items = [(cid, row, vec) for cid, (row, vec) in self.pool.items() if matches(row["_meta"], where)]
+        if len(items) < k:
+            return [], 0.0
+        vecs = np.stack([vec for _, _, vec in items])
+        sims = vecs @ q
+        order = np.argsort(-sims)
+        rows = []
+        for rank, i in enumerate(order, 1):
+            rows.append(dict(items[i][1], rank=rank, score=float(1.0 - sims[i])))
+        return rows, float(np.mean(vecs[order[:k]] @ q_own))
+
+    def _remember(self, rows, vectors):
+        for row, vec in zip(rows, vectors):
+            self.pool.pop(row["id"], None)
+            self.pool[row["id"]] = (row, _unit(vec))
+        while len(self.pool) > self.pool_size:
+            self.pool.popitem(last=False)
+
+    def retrieve(self, partitions, embed, question: str, top_k: int = 12, ctx_k: int = 6, filters=None):
+        """(rows, info) for ``question``: pool re-rank if it scores well enough, else an index search.
+
+        ``info`` has source ("pool" or "index"), followup, history (for the
+        prompt), pool_score, ref_score, ctx_k (passages to send) and ms.
+        """
+        t0 = time.perf_counter()
+        q_own = _unit(embed([question])[0])
+        with partitions.lease(self.version) as (col, base):
+            generation = partitions.generation(self.version)
+            if generation != self.generation:  # re-ingested or promoted: the pool is stale
+                self.reset()
+                self.generation = generation
+            followup = self.is_followup(question)
+            history = self.history() if followup else []
+            q = _unit(q_own + self.blend * self.turns[-1]["vector"]) if followup else q_own
+            where = where_clause(base, filters)
+            k = self.followup_ctx_k if followup else ctx_k
+            # the blended vector ranks the pool, but sufficiency is judged on the question itself,
+            # since the blend pulls every pool chunk towards the previous topic
+            rows, pool_score = self._pool_rank(q, q_own, where, k) if followup else ([], 0.0)
+            source = "pool"
+            if not rows or pool_score < self.reuse_ratio * self.ref_score:
+                res = col.query(query_embeddings=[q.tolist()], n_results=top_k, where=where,
+                                include=["documents", "metadatas", "distances", "embeddings"])
+                rows, vectors = result_rows(res), [_unit(v) for v in (res.get("embeddings") or [[]])[0]]
+                for row, v in zip(rows, vectors):
+                    row["score"] = 1.0 - float(v @ q)  # cosine distance, comparable with pool scores
+                own = [float(v @ q_own) for v in vectors]
+                # same k as the pool score it is compared with
+                self.ref_score = float(np.mean(sorted(own, reverse=True)[:self.followup_ctx_k])) if own else 0.0
+                self._remember(rows, vectors)
+                source = "index"
+            else:
+                for row in rows[:k]:
+                    self.pool.move_to_end(row["id"])
+            self.turns.append({"question": question, "answer": None, "vector": q, "source": source})
+            self.turns = self.turns[-self.max_turns:]
+            return rows, {"source": source, "followup": followup, "history": history, "pool_score": pool_score,
+                          "ref_score": self.ref_score, "ctx_k": k, "ms": (time.perf_counter() - t0) * 1000}
+
+    def record_answer(self, answer: str):
+        if self.turns:
+            self.turns[-1]["answer"] = answer
+
+    def reset(self):
+        self.turns.clear()
+        self.pool.clear()
+        self.ref_score = 0.0
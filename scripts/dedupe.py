@@ -0,0 +1,114 @@
+"""Near-duplicate chunk elimination with MinHash + LSH.
+
+Each chunk becomes a set of word 5-gram shingles and a 64-value MinHash
+signature. Signatures are cut into 16 bands of 4 rows; chunks sharing any
+band bucket are candidates. A candidate pair counts as a duplicate when the
+exact Jaccard similarity of their shingle sets reaches ``threshold``, or
+when the smaller chunk is almost entirely contained in the larger one (a
+short tail window, a table restated inside a longer passage). Clusters are
+joined with union-find. The longest chunk in a cluster is kept and the other
+members' pages go into its ``alt_pages`` metadata as alternate citations.
+That field is a comma-separated string, because Chroma metadata must be
+scalar.
+
+Only chunks with the same edition and filter tags (support purpose,
+category, registration group) are merged, so a filtered search never loses
+a passage. A section restated in two chapters (e.g. nursing under Core and
+under Capacity Building) therefore stays as two chunks.
+"""
+import re, zlib
+
+import numpy as np
+
+NUM_PERM, BANDS = 64, 16
+SCOPE = ("papl_version", "support_purpose", "support_category", "registration_group")
+_P = np.uint64(4294967311)  # prime just above 2**32
+_rng = np.random.default_rng(20250701)
+_A = _rng.integers(1, 2**31, NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, 2**31, NUM_PERM, dtype=np.uint64)[:, None]
+
+
+def shingles(text: str, n: int = 5):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def minhash(sh) -> np.ndarray:
+    if not sh:
+        return np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in sh), dtype=np.uint64, count=len(sh))
+    return ((_A * x[None, :] + _B) % _P).min(axis=1)
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def clusters(texts, threshold: float = 0.8, containment: float = 0.9):
+    """Lists of indices of near-duplicate texts (singletons omitted)."""
+    sets = [shingles(t) for t in texts]
+    sigs = [minhash(s) for s in sets]
+    rows = NUM_PERM // BANDS
+    buckets = {}
+    for i, sig in enumerate(sigs):
+        if not sets[i]:
+            continue
+        for b in range(BANDS):
+            buckets.setdefault((b, sig[b * rows:(b + 1) * rows].tobytes()), []).append(i)
+    parent = list(range(len(texts)))
+    checked = set()
+    for members in buckets.values():
+        for k, i in enumerate(members):
+            for j in members[k + 1:]:
+                if (i, j) in checked:
+                    continue
+                checked.add((i, j))
+                a, b = sets[i], sets[j]
+                inter = len(a & b)
+                if inter / len(a | b) >= threshold or inter / min(len(a), len(b)) >= containment:
+                    parent[_find(parent, j)] = _find(parent, i)
+    groups = {}
+    for i in range(len(texts)):
+        groups.setdefault(_find(parent, i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def _groups(records, threshold, containment, scope):
+    by_scope = {}
+    for i, r in enumerate(records):
+        by_scope.setdefault(tuple(r["metadata"].get(k, "") for k in scope), []).append(i)
+    for members in by_scope.values():
+        for group in clusters([records[i]["text"] for i in members], threshold, containment):
+            yield [members[i] for i in group]
+
+
+def dedupe_records(records, threshold: float = 0.8, containment: float = 0.9, scope=SCOPE):
+    """(kept records in input order, number dropped). Canonical = longest text.
+
+    ``scope`` lists the metadata keys that must match for chunks to merge.
+    """
+    records = list(records)
+    drop = set()
+    for group in _groups(records, threshold, containment, scope):
+        keep = max(group, key=lambda i: (len(records[i]["text"]), -i))
+        meta = records[keep]["metadata"]
+        alts = {int(p) for p in str(meta.get("alt_pages") or "").split(",") if p}
+        for i in group:
+            if i != keep:
+                m = records[i]["metadata"]
+                alts.update(range(m.get("page_start", m.get("page")), m.get("page_end", m.get("page")) + 1))
+                drop.add(i)
+        own = set(range(meta.get("page_start", meta.get("page")), meta.get("page_end", meta.get("page")) + 1))
+        meta["alt_pages"] = ",".join(str(p) for p in sorted(alts - own))
+    return [r for i, r in enumerate(records) if i not in drop], len(drop)
+
+
+def size_report(records):
+    """(chunks, characters, estimated tokens) for a set of records; ~4 characters per token."""
+    chars = sum(len(r["text"]) for r in records)
+    return len(records), chars, chars // 4
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""Chunk-level diff between consecutive PAPL editions, precomputed at ingest.
+
+Chunks of two editions are aligned in two passes:
+
+1. exact: a hash of the normalised text (case, whitespace and edition years
+   such as "2025-26" ignored) pairs identical chunks in O(n);
+2. nearest neighbour: each remaining new chunk queries the old edition's HNSW
+   index for a few candidates, and pairs are taken greedily by cosine
+   similarity above ``threshold``.
+
+Anything left over is ``added`` (new only) or ``removed`` (old only). Rows go
+into the ``chunk_diff`` table of a DuckDB file so the app can answer "what
+changed for X" without searching either corpus. Only adjacent editions are
+diffed, so the work grows linearly with the number of editions.
+
+    python scripts/edition_diff.py --config config.yaml --old 2024-25 --new 2025-26
+"""
+import argparse, hashlib, re, sys
+
+import numpy as np
+
+from papl_collections import discover_versions, read_alias, resolve_partition
+
+YEAR_RE = re.compile(r"\b20\d\d ?[-–/] ?(?:20)?\d\d\b")
+# Only explicit questions about change: "what changed", "what's new", "differences between editions",
+# "how has X changed since 2024-25". Bare "vs" / "since" / "updated" are common in price questions.
+CHANGE_HINT = re.compile(
+    r"\bwhat(?:'?s| has| have| was| were)? (?:been )?(?:chang\w*|new|different|added|removed)\b"
+    r"|\b(?:chang\w*|differen\w*|differ)\b.{0,40}?\b(?:editions?|versions?|papl|last year|previous|since|between|20\d\d)"
+    r"|\bnew in (?:the )?(?:20\d\d|this|latest|current|new)\b", re.I)
+STOPWORDS = set("""a an and are as at be by can do does for from how i in is it of on or that the this to
+was were what whats what's which with change changed changes changing differ different difference
+differences new added removed update updated compare compared since vs versus papl edition last year
+about any anything there has have been between previous current latest""".split())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunk_diff (
+    old_version VARCHAR, new_version VARCHAR, status VARCHAR, similarity DOUBLE,
+    old_id VARCHAR, new_id VARCHAR, old_page INTEGER, new_page INTEGER,
+    section_title VARCHAR, clause_ref VARCHAR, old_text VARCHAR, new_text VARCHAR
+)"""
+
+
+def content_hash(text: str) -> str:
+    norm = YEAR_RE.sub("<year>", re.sub(r"\s+", " ", text or "").strip().lower())
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()
+
+
+def load_edition(client, persist_dir, alias: str, version: str):
+    """(collection, where, ids, documents, metadatas, unit-norm embeddings) for one edition."""
+    name, shared = resolve_partition(client, persist_dir, alias, version)
+    col = client.get_collection(name)
+    where = {"papl_version": version} if shared else None
+    got = col.get(where=where, include=["documents", "metadatas", "embeddings"])
+    emb = np.asarray(got["embeddings"] or [], dtype=np.float32)
+    if len(emb):
+        emb /= np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+    return col, where, got["ids"], got["documents"], got["metadatas"], emb
+
+
+def align(old, new, old_col=None, old_where=None, k: int = 5, threshold: float = 0.85):
+    """Pairs ``(status, old_index, new_index, similarity)`` for two loaded editions.
+
+    ``old``/``new`` are ``(ids, documents, embeddings)``. Candidates for the
+    second pass come from ``old_col``'s index when given, else a dense scan.
+    """
+    old_ids, old_docs, old_emb = old
+    new_ids, new_docs, new_emb = new
+    if len(old_emb) and len(new_emb) and old_emb.shape[1] != new_emb.shape[1]:
+        raise ValueError("editions were embedded with different models; re-ingest one of them")
+
+    by_hash = {}
+    for i, doc in enumerate(old_docs):
+        by_hash.setdefault(content_hash(doc), []).append(i)
+    pairs, old_left, new_left = [], set(range(len(old_ids))), []
+    for j, doc in enumerate(new_docs):
+        bucket = by_hash.get(content_hash(doc))
+        if bucket:
+            i = bucket.pop()
+            old_left.discard(i)
+            pairs.append(("unchanged", i, j, 1.0))
+        else:
+            new_left.append(j)
+
+    cands = []
+    if new_left and old_left:
+        k = min(k, len(old_ids))
+        if old_col is not None:
+            pos = {cid: i for i, cid in enumerate(old_ids)}
+            res = old_col.query(query_embeddings=new_emb[new_left].tolist(), n_results=k,
+                                where=old_where, include=[])
+            hits = [[pos[c] for c in row if c in pos] for row in res["ids"]]
+        else:
+            hits = np.argsort(-(new_emb[new_left] @ old_emb.T), axis=1)[:, :k].tolist()
+        for j, row in zip(new_left, hits):
+            for i in row:
+                if i in old_left:
+                    sim = float(old_emb[i] @ new_emb[j])
+                    if sim >= threshold:
+                        cands.append((sim, i, j))
+    matched_new = set()
+    for sim, i, j in sorted(cands, reverse=True):
+        if i in old_left and j not in matched_new:
+            old_left.discard(i)
+            matched_new.add(j)
+            pairs.append(("changed", i, j, sim))
+    pairs += [("added", None, j, None) for j in new_left if j not in matched_new]
+    pairs += [("removed", i, None, None) for i in sorted(old_left)]
+    return pairs
+
+
+def diff_editions(client, persist_dir, alias: str, old_version: str, new_version: str, **kw):
+    """chunk_diff rows for ``old_version`` -> ``new_version``."""
+    old_col, old_where, o_ids, o_docs, o_meta, o_emb = load_edition(client, persist_dir, alias, old_version)
+    _, _, n_ids, n_docs, n_meta, n_emb = load_edition(client, persist_dir, alias, new_version)
+    pairs = align((o_ids, o_docs, o_emb), (n_ids, n_docs, n_emb), old_col=old_col, old_where=old_where, **kw)
+    rows = []
+    for status, i, j, sim in pairs:
+        om = o_meta[i] if i is not None else {}
+        nm = n_meta[j] if j is not None else {}
+        meta = nm or om
+        rows.append({
+            "old_version": old_version, "new_version": new_version, "status": status, "similarity": sim,
+            "old_id": o_ids[i] if i is not None else None, "new_id": n_ids[j] if j is not None else None,
+            "old_page": om.get("page"), "new_page": nm.get("page"),
+            "section_title": meta.get("section_title", ""), "clause_ref": meta.get("clause_ref", ""),
+            "old_text": o_docs[i] if i is not None and status != "unchanged" else None,
+            "new_text": n_docs[j] if j is not None and status != "unchanged" else None,
+        })
+    return rows
+
+
+def write_diff_db(db_path, old_version: str, new_version: str, rows):
+    import duckdb
+    con = duckdb.connect(str(db_path))
+    try:
+        con.execute(SCHEMA)
+        con.execute("DELETE FROM chunk_diff WHERE old_version = ? AND new_version = ?",
+                    [old_version, new_version])
+        cols = ["old_version", "new_version", "status", "similarity", "old_id", "new_id", "old_page",
+                "new_page", "section_title", "clause_ref", "old_text", "new_text"]
+        con.executemany(f"INSERT INTO chunk_diff VALUES ({', '.join('?' for _ in cols)})",
+                        [tuple(r[c] for c in cols) for r in rows])
+    finally:
+        con.close()
+
+
+def status_counts(rows):
+    counts = {}
+    for r in rows:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return counts
+
+
+def adjacent_pairs(versions, touched):
+    """(older, newer) neighbours that involve any edition in ``touched``."""
+    ordered = sorted(versions)
+    return [(a, b) for a, b in zip(ordered, ordered[1:]) if a in touched or b in touched]
+
+
+def diff_adjacent(client, persist_dir, alias: str, db_path, touched, **kw):
+    """Refresh the diffs next to each edition in ``touched``; returns {pair: status counts}."""
+    live = [v for v in discover_versions("data", persist_dir, alias) if read_alias(persist_dir, alias, v)]
+    report = {}
+    for old_v, new_v in adjacent_pairs(live, set(touched)):
+        rows = diff_editions(client, persist_dir, alias, old_v, new_v, **kw)
+        write_diff_db(db_path, old_v, new_v, rows)
+        report[(old_v, new_v)] = status_counts(rows)
+    return report
+
+
+# ---- Query side ----
+
+def previous_version(con, version: str):
+    row = con.execute("SELECT max(old_version) FROM chunk_diff WHERE new_version = ?", [version]).fetchone()
+    return row[0] if row else None
+
+
+def summary(con, old_version: str, new_version: str):
+    recs = con.execute("SELECT status, count(*) FROM chunk_diff WHERE old_version = ? AND new_version = ? "
+                       "GROUP BY status", [old_version, new_version]).fetchall()
+    return dict(recs)
+
+
+def lookup_changes(con, old_version: str, new_version: str, question: str, limit: int = 6):
+    """Changed/added/removed chunks about the question's topic, best match first.
+
+    Content words are matched as word prefixes against the section title,
+    clause reference and both texts; with no content words the biggest
+    changes are returned.
+    """
+    words = [w for w in dict.fromkeys(re.findall(r"[a-z0-9]+", question.lower()))
+             if w not in STOPWORDS and (len(w) > 2 or w.isdigit())]
+    hay = "lower(concat_ws(' ', section_title, clause_ref, old_text, new_text))"
+    hits = " + ".join(f"CASE WHEN regexp_matches({hay}, ?) THEN 1 ELSE 0 END" for _ in words) or "0"
+    recs = con.execute(
+        f"SELECT status, similarity, old_page, new_page, section_title, clause_ref, old_text, new_text, "
+        f"({hits}) AS hits FROM chunk_diff WHERE old_version = ? AND new_version = ? "
+        f"AND status <> 'unchanged' ORDER BY hits DESC, coalesce(similarity, 0) ASC, new_page, old_page",
+        [*(rf"\b{w}" for w in words), old_version, new_version],
+    ).fetchall()
+    need = max(1, len(words) - (1 if len(words) >= 4 else 0)) if words else 0
+    keys = ["status", "similarity", "old_page", "new_page", "section_title", "clause_ref", "old_text", "new_text"]
+    return [dict(zip(keys, r[:-1])) for r in recs if r[-1] >= need][:limit]
+
+
+def _snippet(text, n=220):
+    text = re.sub(r"\s+", " ", text or "").strip()
+    return text if len(text) <= n else text[:n].rsplit(" ", 1)[0] + "…"
+
+
+def format_changes(rows, old_version: str, new_version: str):
+    """Markdown list of changes with page citations in both editions."""
+    lines = []
+    for r in rows:
+        where = " — ".join(x for x in (r["clause_ref"], r["section_title"]) if x)
+        head = f"- **{r['status'].capitalize()}**" + (f" ({where})" if where else "")
+        if r["status"] == "removed":
+            lines.append(f"{head}: {_snippet(r['old_text'])} (PAPL {old_version}, p.{r['old_page']})")
+        elif r["status"] == "added":
+            lines.append(f"{head}: {_snippet(r['new_text'])} (PAPL {new_version}, p.{r['new_page']})")
+        else:
+            lines.append(f"{head}: {_snippet(r['new_text'])} (PAPL {new_version}, p.{r['new_page']}; "
+                         f"was p.{r['old_page']} in {old_version}, similarity {r['similarity']:.2f})")
+    return "\n".join(lines)
+
+
+def main():
+    import yaml
+    import chromadb
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--old", help="older edition (default: each adjacent pair)")
+    ap.add_argument("--new")
+    ap.add_argument("--threshold", type=float, default=0.85, help="min cosine for a 'changed' pair")
+    args = ap.parse_args()
+
+    cfg = yaml.safe_load(open(args.config))
+    persist_dir = cfg.get("persist_dir", "data/chroma")
+    alias = cfg.get("collection_name", "papl_chunks")
+    db_path = cfg.get("diff_db", "data/papl_diff.duckdb")
+    client = chromadb.PersistentClient(path=persist_dir)
+
+    if args.old and args.new:
+        rows = diff_editions(client, persist_dir, alias, args.old, args.new, threshold=args.threshold)
+        write_diff_db(db_path, args.old, args.new, rows)
+        report = {(args.old, args.new): status_counts(rows)}
+    else:
+        versions = discover_versions("data", persist_dir, alias)
+        report = diff_adjacent(client, persist_dir, alias, db_path, versions, threshold=args.threshold)
+    if not report:
+        sys.exit("need at least two ingested editions to diff")
+    for (old_v, new_v), counts in report.items():
+        print(f"{old_v} -> {new_v}: " + ", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+    print(f"Wrote {db_path}")
+
+
+if __name__ == "__main__":
+    main()
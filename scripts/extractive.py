@@ -0,0 +1,108 @@
+"""Extractive answers from retrieved chunks, for deployments without an LLM.
+
+Every sentence of the retrieved chunks is scored by IDF-weighted overlap with
+the question (words reduced to a 6-character stem, adjacent question words
+in order earn a bonus), scaled by how close its chunk's embedding was to the
+query in the retrieval that was already run. The best 2–4 distinct sentences
+are returned with their page citations and the matched words in bold. It is
+pure Python over a handful of chunks, so it answers in a few milliseconds,
+and it doubles as the fallback when the model call fails or times out.
+"""
+import math, re
+
+SENT_SPLIT = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9“"(])|\s+[•▪]\s+')
+WORD = re.compile(r"[A-Za-z0-9$][A-Za-z0-9$.,'’-]*[A-Za-z0-9]|[A-Za-z0-9]")
+STOPWORDS = set("""a an and are as at be by can do does for from has have how i if in is it its
+me my of on or our so than that the their them then there these they this to us was we were what
+when where which who why will with would you your any all about into not no""".split())
+
+
+def _stem(word: str) -> str:
+    w = word.lower().strip(".,'’-")
+    return w[:6] if not any(c.isdigit() for c in w) else w
+
+
+def _terms(text: str):
+    return [_stem(w) for w in WORD.findall(text) if w.lower() not in STOPWORDS]
+
+
+def split_sentences(text: str, min_chars: int = 25, max_chars: int = 400):
+    out = []
+    for s in SENT_SPLIT.split(text or ""):
+        s = s.strip(" •▪")
+        if len(s) < min_chars:
+            continue
+        if len(s) > max_chars:  # run-on table text: keep the head
+            s = s[:max_chars].rsplit(" ", 1)[0] + "…"
+        out.append(s)
+    return out
+
+
+def _chunk_weights(rows):
+    """0.5–1.0 per row from its retrieval distance (closest chunk = 1.0)."""
+    dists = [r.get("score") for r in rows]
+    known = [d for d in dists if d is not None]
+    if not known or max(known) == min(known):
+        return [1.0] * len(rows)
+    lo, hi = min(known), max(known)
+    return [1.0 if d is None else 1.0 - 0.5 * (d - lo) / (hi - lo) for d in dists]
+
+
+def score_sentences(question: str, rows):
+    """[(score, sentence, row)] for every sentence in ``rows``, best first."""
+    q_terms = list(dict.fromkeys(_terms(question)))
+    if not q_terms:
+        return []
+    pool = []
+    for row, weight in zip(rows, _chunk_weights(rows)):
+        for s in split_sentences(row["full_text"]):
+            pool.append((s, _terms(s), row, weight))
+    df = {}
+    for _, terms, _, _ in pool:
+        for t in set(terms):
+            df[t] = df.get(t, 0) + 1
+    n = len(pool)
+    q_pairs = set(zip(q_terms, q_terms[1:]))
+    scored, seen = [], set()
+    for s, terms, row, weight in pool:
+        key = " ".join(terms)
+        if key in seen:  # chunk overlap repeats sentences
+            continue
+        seen.add(key)
+        present = set(terms)
+        lex = sum(math.log(1 + n / df[t]) for t in q_terms if t in present)
+        if not lex:
+            continue
+        lex += 0.5 * sum(1 for pair in zip(terms, terms[1:]) if pair in q_pairs)
+        lex /= math.sqrt(max(len(terms), 8) / 8)
+        scored.append((lex * weight, s, row))
+    scored.sort(key=lambda x: -x[0])
+    return scored
+
+
+def extractive_answer(question: str, rows, max_sentences: int = 4, min_sentences: int = 2,
+                      rel_cutoff: float = 0.35):
+    """Top sentences as dicts (text, score, citation fields); [] when nothing matches."""
+    scored = score_sentences(question, rows)
+    if not scored:
+        return []
+    best = scored[0][0]
+    picked = [x for x in scored[:max_sentences] if x[0] >= rel_cutoff * best]
+    picked = picked if len(picked) >= min_sentences else scored[:min_sentences]
+    return [{"text": s, "score": round(score, 3), "pages": row["pages"], "clause_ref": row["clause_ref"],
+             "papl_version": row["papl_version"], "id": row.get("id")} for score, s, row in picked]
+
+
+def highlight(sentence: str, question: str) -> str:
+    """Markdown with the question's words in bold."""
+    wanted = set(_terms(question))
+    return WORD.sub(lambda m: f"**{m.group(0)}**" if m.group(0).lower() not in STOPWORDS
+                    and _stem(m.group(0)) in wanted else m.group(0), sentence)
+
+
+def format_extractive(sentences, question: str):
+    lines = []
+    for s in sentences:
+        cite = f"PAPL {s['papl_version']}, p.{s['pages']}" + (f", {s['clause_ref']}" if s["clause_ref"] else "")
+        lines.append(f"- {highlight(s['text'], question)} ({cite})")
+    return "\n".join(lines)
@@ -2,24 +2,52 @@
 import argparse, json, pathlib, yaml, sys
 import chromadb
 from chromadb.utils import embedding_functions
+from papl_collections import discover_versions, generation_name, hnsw_metadata, validate_generation, promote
+from edition_diff import diff_adjacent
+from dedupe import dedupe_records, size_report
+from compact_index import drop_snapshots, export_compact
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", required=True)
     ap.add_argument("--jsonl")
     ap.add_argument("--openai", action="store_true")
+    ap.add_argument("--keep", type=int, help="generations to retain after the swap")
+    ap.add_argument("--all-versions", action="store_true",
+                    help="ingest every data/papl_chunks_*.jsonl into its own partition")
+    ap.add_argument("--no-diff", action="store_true", help="skip the edition diff refresh")
+    ap.add_argument("--dedupe", action="store_true", help="merge near-duplicate chunks (also dedupe: true in config)")
+    ap.add_argument("--no-dedupe", action="store_true", help="index near-duplicate chunks as they are")
     args = ap.parse_args()
 
     cfg = yaml.safe_load(open(args.config))
     persist_dir = pathlib.Path(cfg.get("persist_dir", "data/chroma"))
-    coll_name = cfg.get("collection_name", "papl_chunks")
+    client = chromadb.PersistentClient(path=str(persist_dir))
 
     if args.jsonl:
-        jsonl = pathlib.Path(args.jsonl)
+        with open(args.jsonl, encoding="utf-8") as r:
+            version = json.loads(r.readline())["metadata"]["papl_version"]
+        jobs = [(version, pathlib.Path(args.jsonl))]
     else:
-        jsonl = pathlib.Path("data") / f"papl_chunks_{cfg['papl_version'].replace('/','-')}.jsonl"
+        versions = discover_versions("data") if args.all_versions else [cfg["papl_version"]]
+        jobs = [(v, pathlib.Path("data") / f"papl_chunks_{v.replace('/','-')}.jsonl") for v in versions]
+    for version, jsonl in jobs:
+        ingest_version(client, cfg, args, version, jsonl)
+
+    if not args.no_diff:
+        coll_name = cfg.get("collection_name", "papl_chunks")
+        diff_db = cfg.get("diff_db", "data/papl_diff.duckdb")
+        report = diff_adjacent(client, persist_dir, coll_name, diff_db, [v for v, _ in jobs])
+        for (old_v, new_v), counts in report.items():
+            print(f"Diff {old_v} -> {new_v}: " + ", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
 
-    client = chromadb.PersistentClient(path=str(persist_dir))
+
+def ingest_version(client, cfg, args, version, jsonl):
+    persist_dir = pathlib.Path(cfg.get("persist_dir", "data/chroma"))
+    coll_name = cfg.get("collection_name", "papl_chunks")
+    keep = args.keep or int(cfg.get("keep_generations", 2))
+    staging_name = generation_name(coll_name, version)
+    hnsw = hnsw_metadata(cfg.get("hnsw"))
 
     if args.openai:
         import os
@@ -29,28 +57,49 @@ def main():
         ef = embedding_functions.OpenAIEmbeddingFunction(
             api_key=api_key, model_name="text-embedding-3-small"
         )
-        col = client.get_or_create_collection(coll_name, embedding_function=ef)
+        col = client.create_collection(staging_name, metadata=hnsw, embedding_function=ef)
     else:
         try:
             from sentence_transformers import SentenceTransformer
             model = SentenceTransformer("all-MiniLM-L6-v2")
             def _embed(texts): 
                 return model.encode(texts, normalize_embeddings=True).tolist()
-            col = client.get_or_create_collection(coll_name, embedding_function=_embed)
+            col = client.create_collection(staging_name, metadata=hnsw, embedding_function=_embed)
         except Exception as e:
             print("WARNING: sentence-transformers not available, using default embeddings:", e, file=sys.stderr)
-            col = client.get_or_create_collection(coll_name)
+            col = client.create_collection(staging_name, metadata=hnsw)
 
-    ids, docs, metas = [], [], []
     with open(jsonl, "r", encoding="utf-8") as r:
-        for line in r:
-            rec = json.loads(line)
-            ids.append(rec["id"]); docs.append(rec["text"]); metas.append(rec["metadata"])
+        records = [json.loads(line) for line in r if line.strip()]
+    threshold = float(cfg.get("dedupe_threshold", 0.8))
+    if threshold and (cfg.get("dedupe") or args.dedupe) and not args.no_dedupe:
+        before = size_report(records)
+        records, dropped = dedupe_records(records, threshold)
+        after = size_report(records)
+        print(f"Near-duplicates: dropped {dropped} chunk(s); chunks {before[0]} -> {after[0]}, "
+              f"chars {before[1]} -> {after[1]}, ~tokens {before[2]} -> {after[2]}")
+    ids = [rec["id"] for rec in records]
+    docs = [rec["text"] for rec in records]
+    metas = [rec["metadata"] for rec in records]
 
     for i in range(0, len(ids), 256):
         col.upsert(ids=ids[i:i+256], documents=docs[i:i+256], metadatas=metas[i:i+256])
 
-    print(f"Ingested {len(ids)} chunks into '{coll_name}' at {persist_dir}")
+    try:
+        validate_generation(col, len(ids), cfg.get("smoke_query", ""))
+    except ValueError as e:
+        client.delete_collection(staging_name)
+        print(f"Validation failed, live collection untouched: {e}", file=sys.stderr); sys.exit(1)
+    compact, compact_dir = cfg.get("compact_embeddings"), cfg.get("compact_dir", "data/compact")
+    if compact:
+        # written before the swap, so readers find it as soon as the alias moves
+        size = export_compact(col, str(pathlib.Path(compact_dir) / staging_name), compact)
+        print(f"Wrote {compact} snapshot to {compact_dir}/{staging_name} ({size / 2**20:.2f} MB)")
+    dropped = promote(client, persist_dir, coll_name, staging_name, keep=keep, version=version)
+    drop_snapshots(compact_dir, dropped)
+
+    print(f"Ingested {len(ids)} chunks into '{staging_name}' at {persist_dir}")
+    print(f"Alias '{coll_name}@{version}' -> '{staging_name}'" + (f"; dropped {', '.join(dropped)}" if dropped else ""))
 
 if __name__ == "__main__":
     main()
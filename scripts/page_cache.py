@@ -0,0 +1,84 @@
+"""On-disk cache of extracted page text, keyed by PDF content hash + extractor.
+
+Text extraction dominates chunking time, yet it only changes when the PDF or
+the extractor does. Each cache entry is a single file::
+
+    b"PAPLPG1\\0" | uint32 n_pages | uint32 offsets[n_pages + 1] | zlib(utf-8 text)
+
+where page i is ``text[offsets[i]:offsets[i + 1]]`` (byte offsets into the
+decompressed blob). Pages are stored normalised: whitespace collapsed within
+each line, blank lines dropped, line breaks kept for boilerplate detection.
+"""
+import hashlib, os, re, struct, zlib
+
+MAGIC = b"PAPLPG1\0"
+
+
+def file_sha256(path, bufsize: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(bufsize), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def normalise_page(text: str) -> str:
+    lines = (re.sub(r'\s+', ' ', l).strip() for l in (text or "").splitlines())
+    return "\n".join(l for l in lines if l)
+
+
+def cache_path(cache_dir, pdf_path, extractor_id: str) -> str:
+    tag = re.sub(r"[^A-Za-z0-9_.-]+", "-", extractor_id)
+    return os.path.join(str(cache_dir), f"{file_sha256(pdf_path)[:24]}-{tag}.pages")
+
+
+def save_pages(path, pages):
+    blobs = [p.encode("utf-8") for p in pages]
+    offsets = [0]
+    for b in blobs:
+        offsets.append(offsets[-1] + len(b))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack(f"<I{len(offsets)}I", len(pages), *offsets))
+        f.write(zlib.compress(b"".join(blobs), 6))
+    os.replace(tmp, path)
+
+
+def load_pages(path):
+    """Pages from a cache file, or None if it is missing or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(MAGIC):
+        return None
+    try:
+        pos = len(MAGIC)
+        (n,) = struct.unpack_from("<I", data, pos)
+        offsets = struct.unpack_from(f"<{n + 1}I", data, pos + 4)
+        blob = zlib.decompress(data[pos + 4 * (n + 2):])
+    except (struct.error, zlib.error):
+        return None
+    return [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(n)]
+
+
+def cached_page_texts(pdf_path, extract, extractor_id: str, cache_dir=None):
+    """Normalised page texts for ``pdf_path``, running ``extract(pdf_path)`` on a miss.
+
+    ``extractor_id`` must change whenever the extractor's output can (name and
+    library version). With ``cache_dir`` unset the cache is bypassed.
+    """
+    if not cache_dir:
+        return [normalise_page(t) for t in extract(pdf_path)]
+    path = cache_path(cache_dir, pdf_path, extractor_id)
+    pages = load_pages(path)
+    if pages is None:
+        pages = [normalise_page(t) for t in extract(pdf_path)]
+        try:
+            save_pages(path, pages)
+        except OSError:
+            pass  # read-only data dir: still return the fresh extraction
+    return pages
@@ -0,0 +1,178 @@
+"""Rendered PDF pages for source cards, with the cited passage highlighted.
+
+Remote users can't open ``{pdf}#page=N`` on the server's filesystem, and
+sending the whole PDF for one citation is wasteful. ``PageRenderer.render``
+rasterises a single page with pdfium and paints a translucent highlight over
+the words the cited chunk shares with it: word runs of four or more, aligned
+with difflib, then pdfium's text rectangles. With ``crop=True`` only the
+highlighted band is kept. The image is encoded as PNG with zlib (no imaging
+library needed).
+
+Images go to a size-bounded disk cache keyed by PDF content hash, page,
+scale, crop and passage. Hits are file reads. Each hit bumps the file's mtime,
+and the oldest files are deleted once the cache exceeds ``max_mb``.
+"""
+import difflib, hashlib, os, re, struct, threading, zlib
+
+import numpy as np
+
+from page_cache import file_sha256
+
+WORD = re.compile(r"\w+")
+HIGHLIGHT = np.array([255, 221, 87], dtype=np.float32)  # amber
+MIN_RUN = 4  # shortest run of shared words that counts as part of the passage
+
+_pdfium_lock = threading.Lock()  # pdfium is not thread-safe
+
+
+def encode_png(rgb) -> bytes:
+    """PNG bytes for an (h, w, 3) uint8 array."""
+    h, w, _ = rgb.shape
+    raw = np.concatenate([np.zeros((h, 1), dtype=np.uint8), rgb.reshape(h, w * 3)], axis=1).tobytes()
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b""))
+
+
+def _word_spans(text):
+    return [(m.group(0).lower(), m.start(), m.end()) for m in WORD.finditer(text)]
+
+
+def passage_ranges(page_text: str, passage: str, min_run: int = MIN_RUN):
+    """(start, end) character ranges of ``page_text`` that belong to ``passage``."""
+    page_words = _word_spans(page_text)
+    wanted = [w for w, _, _ in _word_spans(passage)]
+    sm = difflib.SequenceMatcher(None, [w for w, _, _ in page_words], wanted, autojunk=False)
+    return [(page_words[b.a][1], page_words[b.a + b.size - 1][2])
+            for b in sm.get_matching_blocks() if b.size >= min_run]
+
+
+class RenderCache:
+    """Files in ``cache_dir``, least recently used deleted beyond ``max_mb``."""
+
+    def __init__(self, cache_dir: str, max_mb: float = 64):
+        self.cache_dir, self.max_bytes = cache_dir, int(max_mb * 2**20)
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _files(self):
+        out = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".png"):
+                try:
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                out.append((st.st_mtime, st.st_size, name))
+        return out
+
+    def get(self, key: str):
+        path = os.path.join(self.cache_dir, key + ".png")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = os.path.join(self.cache_dir, key + ".png")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.trim()
+
+    def trim(self):
+        with self._lock:
+            files = sorted(self._files())
+            total = sum(size for _, size, _ in files)
+            for _, size, name in files:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    total -= size
+                except OSError:
+                    pass
+
+    def stats(self):
+        files = self._files()
+        return {"entries": len(files), "bytes": sum(s for _, s, _ in files), "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+class PageRenderer:
+    """Renders (and caches) single pages of the PAPL PDFs."""
+
+    def __init__(self, cache_dir: str = "data/cache/render", max_mb: float = 64, scale: float = 1.5):
+        self.cache = RenderCache(cache_dir, max_mb)
+        self.scale = scale
+        self._hashes = {}  # (path, mtime, size) -> sha256, so the PDF is hashed once
+
+    def pdf_hash(self, pdf_path: str) -> str:
+        st = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), st.st_mtime, st.st_size)
+        if key not in self._hashes:
+            self._hashes[key] = file_sha256(pdf_path)
+        return self._hashes[key]
+
+    def key(self, pdf_path: str, page: int, passage: str = "", crop: bool = False, scale: float = None):
+        digest = hashlib.sha1((passage or "").encode("utf-8")).hexdigest()[:12]
+        return f"{self.pdf_hash(pdf_path)[:24]}-p{int(page)}-s{scale or self.scale:g}-{'c' if crop else 'f'}-{digest}"
+
+    def render(self, pdf_path: str, page: int, passage: str = "", crop: bool = False, scale: float = None):
+        """(png bytes, cache key) for 1-based ``page``, highlighting ``passage`` if given."""
+        key = self.key(pdf_path, page, passage, crop, scale)
+        data = self.cache.get(key)
+        if data is None:
+            data = encode_png(rasterise(pdf_path, page, passage, crop, scale or self.scale))
+            self.cache.put(key, data)
+        return data, key
+
+
+def rasterise(pdf_path: str, page: int, passage: str = "", crop: bool = False, scale: float = 1.5):
+    """RGB array of one page with the passage's words highlighted."""
+    import pypdfium2 as pdfium
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(str(pdf_path))
+        try:
+            if not 1 <= page <= len(pdf):
+                raise ValueError(f"page {page} is outside 1..{len(pdf)}")
+            pg = pdf[page - 1]
+            height = pg.get_size()[1]
+            img = pg.render(scale=scale, rev_byteorder=True).to_numpy()[:, :, :3].copy()
+            boxes = []
+            if passage:
+                tp = pg.get_textpage()
+                n = tp.count_chars()
+                text = tp.get_text_range(0, n, force_this=True)
+                for start, end in passage_ranges(text, passage):
+                    for i in range(tp.count_rects(start, end - start)):
+                        left, bottom, right, top = tp.get_rect(i)
+                        boxes.append((int(left * scale), int((height - top) * scale),
+                                      int(np.ceil(right * scale)), int(np.ceil((height - bottom) * scale))))
+                tp.close()
+            pg.close()
+        finally:
+            pdf.close()
+    for x0, y0, x1, y1 in boxes:
+        region = img[max(y0 - 1, 0):y1 + 1, max(x0 - 1, 0):x1 + 1].astype(np.float32)
+        # multiply blend: text stays dark, paper turns amber
+        img[max(y0 - 1, 0):y1 + 1, max(x0 - 1, 0):x1 + 1] = (region * HIGHLIGHT / 255).astype(np.uint8)
+    if crop and boxes:
+        margin = int(24 * scale)
+        top = max(min(b[1] for b in boxes) - margin, 0)
+        bottom = min(max(b[3] for b in boxes) + margin, img.shape[0])
+        img = img[top:bottom]
+    return img
@@ -0,0 +1,319 @@
+"""Blue/green generations and per-version partitions for the PAPL Chroma index.
+
+Ingestion never writes into the collection that is being served. Each build
+goes into a fresh generation named ``<alias>__<version>__<UTC stamp>``, is
+validated, and only then is the alias record (``aliases.json`` in the persist
+dir) repointed at it. Readers resolve the alias when they open the index and
+re-check it whenever ``aliases.json`` changes, so a long-running app or API
+moves to a generation promoted by another process on its next query.
+Older generations are garbage collected, keeping the most recent few and the
+one that was live before the promote, for in-flight readers and rollback.
+
+Each PAPL edition is its own partition: the alias record holds one entry per
+version (``papl_chunks@2025-26``), so queries search a single edition's HNSW
+graph without a ``papl_version`` filter. ``PartitionCache`` opens partitions
+lazily and unloads the least recently used ones when too many are resident
+or the process exceeds its memory budget.
+"""
+import glob, json, os, re, threading, time, warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+
+ALIAS_FILE = "aliases.json"
+CHUNKS_GLOB = "papl_chunks_*.jsonl"
+# MiniLM embeddings are unit-normalised, so rank by cosine rather than Chroma's default l2
+DEFAULT_HNSW = {"space": "cosine", "M": 16, "construction_ef": 200, "search_ef": 64}
+
+
+class UnknownVersion(KeyError):
+    """No index holds this PAPL edition."""
+
+
+def _safe(part: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "-", part).strip("-") or "x"
+
+
+def hnsw_metadata(params: dict = None) -> dict:
+    """Collection metadata recording the HNSW settings (``hnsw:space``, ``hnsw:M``, ...).
+
+    Only applied when a generation is created: Chroma reads them when it
+    builds the index, so changing them means re-ingesting.
+    """
+    merged = dict(DEFAULT_HNSW, **(params or {}))
+    if merged["space"] not in ("cosine", "l2", "ip"):
+        raise ValueError(f"hnsw space must be cosine, l2 or ip, not {merged['space']!r}")
+    return {f"hnsw:{k}": (v if k == "space" else int(v)) for k, v in merged.items()}
+
+
+def generation_name(alias: str, version: str, stamp: str = None) -> str:
+    stamp = stamp or time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    return f"{alias}__{_safe(version)}__{stamp}"
+
+
+def alias_key(alias: str, version: str = None) -> str:
+    return f"{alias}@{version}" if version else alias
+
+
+def read_aliases(persist_dir) -> dict:
+    path = os.path.join(str(persist_dir), ALIAS_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def read_alias(persist_dir, alias: str, version: str = None):
+    return read_aliases(persist_dir).get(alias_key(alias, version))
+
+
+def write_alias(persist_dir, alias: str, target: str, version: str = None):
+    """Point ``alias`` (for ``version``) at ``target``; the rename makes the swap atomic."""
+    aliases = read_aliases(persist_dir)
+    aliases[alias_key(alias, version)] = target
+    path = os.path.join(str(persist_dir), ALIAS_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _collection_names(client):
+    return [getattr(c, "name", c) for c in client.list_collections()]
+
+
+def resolve_collection_name(client, persist_dir, alias: str) -> str:
+    """Live collection behind ``alias``; falls back to a legacy collection named ``alias``."""
+    target = read_alias(persist_dir, alias)
+    if target and target in _collection_names(client):
+        return target
+    return alias
+
+
+def resolve_partition(client, persist_dir, alias: str, version: str):
+    """(collection name, needs_version_filter) for one edition.
+
+    Prefers the version's own partition; otherwise the shared (pre-partition)
+    collection, which still needs a ``papl_version`` filter.
+    """
+    target = read_alias(persist_dir, alias, version)
+    if target and target in _collection_names(client):
+        return target, False
+    return resolve_collection_name(client, persist_dir, alias), True
+
+
+def discover_versions(data_dir="data", persist_dir=None, alias: str = None):
+    """Editions with a chunk file in ``data_dir`` or a partition in the alias record, newest first."""
+    versions = {os.path.basename(p)[len("papl_chunks_"):-len(".jsonl")]
+                for p in glob.glob(os.path.join(str(data_dir), CHUNKS_GLOB))}
+    if persist_dir and alias:
+        prefix = f"{alias}@"
+        versions |= {k[len(prefix):] for k in read_aliases(persist_dir) if k.startswith(prefix)}
+    return sorted(versions, reverse=True)
+
+
+def validate_generation(col, expected_count: int, smoke_query: str = ""):
+    """Raise ValueError unless ``col`` holds every chunk and answers a smoke query."""
+    n = col.count()
+    if n != expected_count:
+        raise ValueError(f"staging collection '{col.name}' has {n} chunks, expected {expected_count}")
+    if smoke_query:
+        res = col.query(query_texts=[smoke_query], n_results=1)
+        if not (res.get("ids") or [[]])[0]:
+            raise ValueError(f"smoke query {smoke_query!r} returned nothing from '{col.name}'")
+
+
+def list_generations(client, alias: str, version: str = None):
+    """Generation names for ``alias`` (one version, or all), oldest first."""
+    prefix = f"{alias}__{_safe(version)}__" if version else f"{alias}__"
+    gens = [n for n in _collection_names(client) if n.startswith(prefix)]
+    return sorted(gens, key=lambda n: n.rsplit("__", 1)[-1])
+
+
+def alias_stamp(persist_dir):
+    """Changes whenever the alias record is rewritten (None if there is none yet)."""
+    try:
+        st = os.stat(os.path.join(str(persist_dir), ALIAS_FILE))
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def gc_generations(client, persist_dir, alias: str, keep: int = 2, version: str = None, protect=()):
+    """Drop all but the live generation, ``protect`` and the newest ``keep`` overall (per version)."""
+    live = set(read_aliases(persist_dir).values())
+    gens = list_generations(client, alias, version)
+    retained = set(gens[-max(1, keep):]) | live | set(protect)
+    dropped = []
+    for name in gens:
+        if name in retained:
+            continue
+        client.delete_collection(name)
+        dropped.append(name)
+    return dropped
+
+
+def promote(client, persist_dir, alias: str, name: str, keep: int = 2, version: str = None):
+    """Repoint ``alias`` (for ``version``) at the validated generation and collect old ones.
+
+    The generation that was live until now is kept, since readers in other
+    processes may still hold it until they notice the new alias record.
+    """
+    previous = read_alias(persist_dir, alias, version)
+    write_alias(persist_dir, alias, name, version)
+    return gc_generations(client, persist_dir, alias, keep=keep, version=version,
+                          protect=[previous] if previous else ())
+
+
+# ---- Lazily loaded partitions ----
+
+def rss_mb() -> float:
+    """Current resident set size; peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        import resource
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return kb / 1024 if os.uname().sysname != "Darwin" else kb / 2**20
+
+
+def unload_collection(client, collection_id):
+    """Release a collection's in-memory segments; the next query reloads them from disk.
+
+    chromadb 0.4.x has no public API for this, so it reaches into the local
+    segment manager. If that layout changes it warns and leaves the segments
+    loaded; errors from stopping a segment propagate. Only call it for a
+    collection no thread is querying (``PartitionCache`` counts leases).
+    """
+    try:
+        mgr = client._server._manager
+        lock, segments, instances = mgr._lock, mgr._segment_cache, mgr._instances
+    except AttributeError as e:
+        warnings.warn(f"cannot unload Chroma collection {collection_id}: unknown chromadb layout ({e})")
+        return
+    handles = getattr(mgr, "_vector_instances_file_handle_cache", None)
+    if handles is not None and collection_id in handles.cache:
+        handles.cache.pop(collection_id).close_persistent_index()
+    with lock:
+        for seg in segments.pop(collection_id, {}).values():
+            inst = instances.pop(seg["id"], None)
+            if inst is not None:
+                inst.stop()
+
+
+class PartitionCache:
+    """Per-version collections, opened on first use and evicted least-recently-used.
+
+    ``get(version)`` returns ``(collection, where)``; ``where`` is the version
+    filter needed when the edition has no partition of its own, else None.
+    An edition with no index raises ``UnknownVersion`` and is not cached.
+    At most ``capacity`` partitions stay resident, fewer while RSS is above
+    ``mem_budget_mb`` (0 disables the memory check). Query through
+    ``with cache.lease(version) as (col, where):`` when other threads may evict:
+    an evicted collection is only unloaded once its last lease ends. A cached partition is
+    re-resolved when ``aliases.json`` has changed since it was opened, and
+    reopened if its version now points at another generation. With ``compact_dir``,
+    a generation that has a quantised snapshot there (compact_index.py) is
+    served from it instead of from Chroma.
+    """
+
+    def __init__(self, client, persist_dir, alias: str, capacity: int = 2, mem_budget_mb: float = 0,
+                 compact_dir: str = None, **collection_kwargs):
+        self.client, self.persist_dir, self.alias = client, persist_dir, alias
+        self.capacity, self.mem_budget_mb = max(1, capacity), mem_budget_mb
+        self.compact_dir = compact_dir
+        self.collection_kwargs = collection_kwargs
+        self._lru = OrderedDict()  # version -> (collection, where)
+        self._names = {}  # version -> (generation name, alias stamp when resolved)
+        self._leases = {}  # collection id -> queries in flight
+        self._doomed = set()  # evicted collection ids waiting for their last lease
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def lease(self, version: str):
+        """``get(version)``, with the collection kept loaded until the block exits."""
+        with self._lock:
+            entry = self.get(version)
+            cid = entry[0].id
+            self._leases[cid] = self._leases.get(cid, 0) + 1
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                self._leases[cid] -= 1
+                if not self._leases[cid]:
+                    del self._leases[cid]
+                    if cid in self._doomed:
+                        self._doomed.discard(cid)
+                        if all(c.id != cid for c, _ in self._lru.values()):
+                            unload_collection(self.client, cid)
+
+    def get(self, version: str):
+        with self._lock:
+            stamp = alias_stamp(self.persist_dir)
+            if version in self._lru:
+                name, seen = self._names[version]
+                if seen == stamp:
+                    self._lru.move_to_end(version)
+                    return self._lru[version]
+                current, _ = resolve_partition(self.client, self.persist_dir, self.alias, version)
+                if current == name:
+                    self._names[version] = (name, stamp)
+                    self._lru.move_to_end(version)
+                    return self._lru[version]
+                self.evict(version)  # promoted elsewhere: reopen on the new generation
+            name, shared = resolve_partition(self.client, self.persist_dir, self.alias, version)
+            snapshot = os.path.join(self.compact_dir, name) if self.compact_dir else None
+            if snapshot and os.path.isfile(os.path.join(snapshot, "codes.npy")):
+                from compact_index import CompactPartition
+                col = CompactPartition(snapshot, self.collection_kwargs.get("embedding_function"))
+            else:
+                try:
+                    col = self.client.get_collection(name, **self.collection_kwargs)
+                except ValueError:  # chromadb: "Collection ... does not exist"
+                    raise UnknownVersion(f"no index for PAPL {version}") from None
+            if shared and not col.get(where={"papl_version": version}, limit=1)["ids"]:
+                # only the pre-partition collection is left, and it has no chunks for this edition
+                raise UnknownVersion(f"no index for PAPL {version}")
+            entry = (col, {"papl_version": version} if shared else None)
+            self._lru[version] = entry
+            self._names[version] = (name, stamp)
+            self._trim(keep=version)
+            return entry
+
+    def evict(self, version: str):
+        """Forget ``version`` (e.g. after a re-ingest) and release its memory."""
+        with self._lock:
+            entry = self._lru.pop(version, None)
+            self._names.pop(version, None)
+            if entry is None:
+                return
+            col_id = entry[0].id
+            if isinstance(col_id, str):  # compact snapshot: dropping the reference frees it
+                return
+            if any(c.id == col_id for c, _ in self._lru.values()):
+                return
+            if self._leases.get(col_id):
+                self._doomed.add(col_id)  # unloaded when the last query using it finishes
+            else:
+                unload_collection(self.client, col_id)
+
+    def _over_budget(self):
+        return bool(self.mem_budget_mb) and rss_mb() > self.mem_budget_mb
+
+    def _trim(self, keep: str):
+        while len(self._lru) > 1 and (len(self._lru) > self.capacity or self._over_budget()):
+            oldest = next(v for v in self._lru if v != keep)
+            self.evict(oldest)
+
+    def loaded(self):
+        with self._lock:
+            return list(self._lru)
+
+    def generation(self, version: str):
+        """Name of the generation ``version`` was last opened on (None if it is not loaded)."""
+        with self._lock:
+            return self._names.get(version, (None,))[0]
@@ -0,0 +1,189 @@
+"""Retrieval, prompt and answer logic shared by the Streamlit app and the HTTP API.
+
+Nothing here imports Streamlit: callers own configuration, caching and error
+display. ``retrieve`` searches one edition through a ``PartitionCache``;
+``price_answer``/``change_answer`` are the SQL short-cuts tried before the
+LLM; ``complete`` calls the chat model, optionally streaming, and
+``local_answer`` is the extractive answer used without a model or when the
+call fails.
+"""
+import os
+
+from edition_diff import CHANGE_HINT, format_changes, lookup_changes, previous_version
+from extractive import extractive_answer, format_extractive
+from price_tables import format_price_answer, lookup_prices
+
+MODEL = os.environ.get("PAPL_MODEL", "gpt-4o-mini")
+LLM_TIMEOUT = float(os.environ.get("PAPL_LLM_TIMEOUT", "20"))
+FILTER_KEYS = ("support_purpose", "support_category", "registration_group")
+
+SYSTEM_PROMPT = """You are a careful assistant answering questions about the NDIS Pricing Arrangements and Price Limits (PAPL).
+Rules:
+1) Answer ONLY using the supplied CONTEXT passages.
+2) If the answer is not explicitly supported by the CONTEXT, reply exactly: "I can’t find that in the PAPL context provided."
+3) Always include citations that reference the PAPL version and page numbers; include clause references when available.
+4) Keep answers concise, plain UK English, and use AUD$ where prices are quoted.
+5) If the user asks for advice beyond the PAPL’s scope (e.g., clinical, legal, policy positions), respond: "Out of scope for PAPL. Please consult the official guidance."
+"""
+
+
+def page_label(m):
+    # Chunks can now span a page break; older indexes only carry "page"
+    p0 = m.get("page_start", m.get("page", "?"))
+    p1 = m.get("page_end", p0)
+    return f"{p0}–{p1}" if p1 != p0 else f"{p0}"
+
+
+def result_rows(res, k: int = 0):
+    """Rows for the ``k``-th query of a Chroma query result."""
+    ids = (res.get("ids") or [[]])[k]
+    docs = (res.get("documents") or [[]])[k]
+    metas = (res.get("metadatas") or [[]])[k]
+    dists = (res.get("distances") or [[]])[k] or []
+    rows = []
+    for i, (d, m) in enumerate(zip(docs, metas)):
+        rows.append(
+            {
+                "id": ids[i] if i < len(ids) else None,
+                "rank": i + 1,
+                "score": dists[i] if i < len(dists) else None,
+                "preview": (d[:360] + "…") if len(d) > 360 else d,
+                "page": m.get("page"),
+                "pages": page_label(m),
+                "alt_pages": m.get("alt_pages", ""),
+                "section": m.get("section_title", ""),
+                "clause_ref": m.get("clause_ref", ""),
+                "papl_version": m.get("papl_version", ""),
+                "pdf": m.get("source_pdf_path", ""),
+                "full_text": d,
+                "_meta": m,
+            }
+        )
+    return rows
+
+
+def source_pdf(stored: str, version: str, configured=None, data_dir: str = "data") -> str:
+    """The edition's PDF on this machine, or "" if there is none.
+
+    The path recorded at ingest wins while it exists; then ``configured``
+    (edition -> PDF path, e.g. the config's pdf_path for its edition); then
+    ``data_dir/NDIS_PAPL_<version>.pdf``.
+    """
+    candidates = [stored, (configured or {}).get(version),
+                  os.path.join(data_dir, f"NDIS_PAPL_{str(version).replace('/', '-')}.pdf") if version else ""]
+    return next((p for p in candidates if p and os.path.isfile(p)), "")
+
+
+def where_clause(base=None, filters=None):
+    """Chroma ``where`` combining the partition's own filter with metadata filters.
+
+    ``filters`` maps FILTER_KEYS to a value; empty values and "All" are ignored.
+    """
+    clauses = [base] if base else []
+    for key, value in (filters or {}).items():
+        if key not in FILTER_KEYS:
+            raise ValueError(f"unknown filter {key!r}; use {', '.join(FILTER_KEYS)}")
+        if value and value != "All":
+            clauses.append({key: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def retrieve(partitions, queries, version: str, top_k: int = 12, filters=None):
+    """Ranked rows per query; one Chroma call embeds and searches the whole batch.
+
+    ``filters`` are pushed into the vector query, so only matching chunks are searched.
+    """
+    with partitions.lease(version) as (col, where):
+        res = col.query(query_texts=list(queries), n_results=top_k, where=where_clause(where, filters))
+    return [result_rows(res, k) for k in range(len(queries))]
+
+
+def build_prompt(question: str, ctx_blocks, history=()):
+    """User message: earlier (question, answer) turns if any, the question, then the passages."""
+    earlier = "".join(f"Q: {q}\nA: {a}\n" for q, a in history)
+    earlier = f"Earlier in this conversation:\n{earlier}\n" if earlier else ""
+    context_text = "\n\n".join(
+        f"[Source: {m.get('papl_version','?')} {m.get('clause_ref','')} p.{page_label(m)}"
+        + (f"; also p.{m['alt_pages']}" if m.get("alt_pages") else "") + f"] {t}"
+        for (t, m) in ctx_blocks
+    )
+    return f"{earlier}Question: {question}\n\nCONTEXT:\n{context_text}\n\nAnswer briefly with citations."
+
+
+def openai_client(api_key: str):
+    """(mode, client) for the installed OpenAI SDK: "v1" client or legacy "v0" module."""
+    try:
+        from openai import OpenAI
+
+        return "v1", OpenAI(api_key=api_key)
+    except ImportError:
+        import openai as _openai
+
+        _openai.api_key = api_key
+        return "v0", _openai
+
+
+def complete(mode: str, client, question: str, ctx_blocks, stream: bool = False, timeout: float = LLM_TIMEOUT,
+             history=()):
+    """Model answer for the question over ``ctx_blocks``; an iterator of text deltas if ``stream``.
+
+    ``history`` is earlier (question, answer) pairs for follow-ups.
+    Raises on errors, including ``timeout`` seconds without a response.
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_prompt(question, ctx_blocks, history)},
+    ]
+    if mode == "v1":
+        if stream:
+            chunks = client.chat.completions.create(model=MODEL, messages=messages, stream=True, timeout=timeout)
+            return (c.choices[0].delta.content for c in chunks if c.choices and c.choices[0].delta.content)
+        response = client.chat.completions.create(model=MODEL, messages=messages, timeout=timeout)
+        text = response.choices[0].message.content.strip()
+    else:
+        response = client.ChatCompletion.create(model=MODEL, messages=messages, request_timeout=timeout)
+        text = response.choices[0].message["content"].strip()
+    return iter([text]) if stream else text
+
+
+def local_answer(question: str, rows):
+    """(markdown, sentences) picked from the retrieved rows, or (None, []) if nothing matches."""
+    sentences = extractive_answer(question, rows)
+    return (format_extractive(sentences, question) if sentences else None), sentences
+
+
+def price_answer(db_path, question: str, version: str):
+    """Answer straight from the price_limits table; None means fall back to RAG."""
+    if not os.path.exists(db_path):
+        return None
+    try:
+        import duckdb
+
+        con = duckdb.connect(str(db_path), read_only=True)
+        try:
+            items = lookup_prices(con, version, question)
+        finally:
+            con.close()
+    except Exception:
+        return None  # e.g. locked by a concurrent ingest
+    return format_price_answer(items, version, question) if items else None
+
+
+def change_answer(db_path, question: str, version: str):
+    """(previous version, markdown) from the precomputed edition diff; None falls back to RAG."""
+    if not CHANGE_HINT.search(question) or not os.path.exists(db_path):
+        return None
+    try:
+        import duckdb
+
+        con = duckdb.connect(str(db_path), read_only=True)
+        try:
+            old = previous_version(con, version)
+            rows = lookup_changes(con, old, version, question) if old else []
+        finally:
+            con.close()
+    except Exception:
+        return None
+    return (old, format_changes(rows, old, version)) if rows else None
@@ -0,0 +1,151 @@
+"""Document structure for the chunker: headings and O(log n) section lookup.
+
+Headings come from the first source that yields any, in order: the PDF outline
+(bookmarks), the printed table of contents ("Title ....... 12"), then numbered
+headings in the body ("3.2 Claiming Rules"). Each heading is then located in
+the chunk stream, and ``SectionIndex`` maps a stream offset to its
+``section_title`` (top-level heading) and ``clause_ref`` with a bisect.
+"""
+import re
+from bisect import bisect_right
+from collections import namedtuple
+
+Heading = namedtuple("Heading", "page level title number")
+
+_TOC_LINE = re.compile(r'^\s*(.+?)\s*\.{3}[.\s]*?(\d+)\s*$')
+_NUMBERED = re.compile(r'^\s*(\d+(?:\.\d+)*)\.?\s+([A-Z][^$]{2,80}?)\s*$')
+
+
+def squash(text: str) -> str:
+    return re.sub(r'\s+', '', text).lower()
+
+
+def _tidy(title: str) -> str:
+    return re.sub(r'\s+', ' ', title).strip()
+
+
+def _split_number(title: str):
+    m = re.match(r'^(\d+(?:\.\d+)*)\.?\s+(.+)$', title)
+    return (m.group(1), m.group(2)) if m else ("", title)
+
+
+def outline_headings(reader):
+    """Flatten PyPDF2 bookmarks into Headings; [] when the PDF has no outline."""
+    out = []
+
+    def walk(items, level):
+        for item in items:
+            if isinstance(item, list):
+                walk(item, level + 1)
+                continue
+            try:
+                page = reader.get_destination_page_number(item) + 1
+            except Exception:
+                continue
+            number, title = _split_number(_tidy(item.title or ""))
+            if title:
+                out.append(Heading(page, level, title, number))
+
+    try:
+        walk(reader.outline or [], 0)
+    except Exception:
+        return []
+    return out
+
+
+def toc_headings(page_texts, top_level=()):
+    """Parse dotted-leader contents lines; titles in ``top_level`` become level 0."""
+    top = {squash(t) for t in top_level}
+    n_pages, out = len(page_texts), []
+    for text in page_texts:
+        for line in (text or "").splitlines():
+            m = _TOC_LINE.match(line)
+            if not m:
+                continue
+            page = int(m.group(2))
+            number, title = _split_number(_tidy(m.group(1)))
+            if 0 < page <= n_pages and title:
+                level = 0 if not top or squash(title) in top else 1
+                out.append(Heading(page, level, title, number))
+    return out
+
+
+def numbered_headings(page_texts):
+    out = []
+    for i, text in enumerate(page_texts):
+        for line in (text or "").splitlines():
+            m = _NUMBERED.match(line)
+            if m and not m.group(2)[-1:].isdigit():
+                number = m.group(1)
+                out.append(Heading(i + 1, number.count("."), _tidy(m.group(2)), number))
+    return out
+
+
+def detect_headings(reader, page_texts, top_level=()):
+    return (outline_headings(reader) if reader is not None else []) \
+        or toc_headings(page_texts, top_level) \
+        or numbered_headings(page_texts)
+
+
+def locate_headings(headings, page_lines, page_offsets):
+    """Place headings in the stream.
+
+    ``page_lines[p]`` are the normalised body lines of page p and
+    ``page_offsets[p]`` the stream offset where that page's text begins. A
+    heading matches the first line on its page that it starts (or that starts
+    it, for titles wrapped over two lines). Returns [(offset, Heading)].
+    """
+    placed = []
+    for h in headings:
+        lines, base = page_lines.get(h.page), page_offsets.get(h.page)
+        if not lines or base is None:
+            continue
+        want = squash(h.title)
+        pos = base
+        for line in lines:
+            got = squash(line)
+            short = min(len(got), len(want))
+            if short >= 4 and (got.startswith(want) or (short >= 12 and want.startswith(got))):
+                placed.append((pos, h))
+                break
+            pos += len(line) + 1
+    placed.sort(key=lambda x: x[0])
+    return placed
+
+
+class SectionIndex:
+    """Sorted heading offsets with bisect lookup of (section_title, clause_ref)."""
+
+    def __init__(self, placed):
+        self.offsets, self.sections, self.clauses = [], [], []
+        section = ""
+        for off, h in placed:
+            if h.level == 0:
+                section = h.title
+            self.offsets.append(off)
+            self.sections.append(section)
+            self.clauses.append(h.number or ("" if h.level == 0 else h.title))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def lookup(self, offset):
+        i = bisect_right(self.offsets, offset) - 1
+        if i < 0:
+            return "", ""
+        return self.sections[i], self.clauses[i]
+
+
+class PageRanges:
+    """Bisect lookup over (start_page, end_page, title) ranges, e.g. section_map_csv."""
+
+    def __init__(self, ranges):
+        ranges = sorted(ranges)
+        self.starts = [s for s, _, _ in ranges]
+        self.ranges = ranges
+
+    def __call__(self, page):
+        i = bisect_right(self.starts, page) - 1
+        if i >= 0 and page <= self.ranges[i][1]:
+            return self.ranges[i][2]
+        return ""
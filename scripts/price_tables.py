@@ -0,0 +1,167 @@
+"""Price-limit tables: extraction into DuckDB/Parquet and a direct lookup path.
+
+PAPL price tables are printed as::
+
+    Item Number Item Name and Notes Unit National Remote Very Remote
+    01_010_0107_1_1 Assistance with Self-Care Activities - Night-Time
+    Sleepover
+    Each $297.60 $416.64 $446.40
+
+``parse_price_rows`` walks the page lines with a small state machine and emits
+one long-format row per (item, region). ``write_price_db`` stores them in the
+``price_limits`` table (indexed on item number) and optionally a Parquet
+file. ``lookup_prices``/``format_price_answer`` let the app answer price
+questions straight from SQL, with page citations, before falling back to RAG.
+"""
+import re
+
+ITEM_RE = re.compile(r'\b\d{2}_\d{3,9}_\d{4}_\d_\d\b')
+REGION_RE = re.compile(r'Very Remote|Remote|National|ACT|NSW|NT|QLD|SA|TAS|VIC|WA')
+PRICE_TOKEN = r'(?:\$[\d,]+(?:\.\d+)?|N/A)'
+UNITS = r'Hour|Each|Day|Week|Month|Year|Annual|Km|Session'
+PRICE_HINT = re.compile(r'price|limit|cost|rate|how much|\$|charge|fee|loading|remote', re.I)
+STOPWORDS = set("""a an and are as at be by can do does for from how i in is it item limit limits
+many much of on or per price prices rate rates support supports that the this to under what whats
+what's which with remote very national cost costs charge charges loading""".split())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_limits (
+    papl_version VARCHAR, item_number VARCHAR, item_name VARCHAR, unit VARCHAR,
+    region VARCHAR, price DOUBLE, quotable BOOLEAN, page INTEGER
+)"""
+
+
+def _regions(header: str):
+    return REGION_RE.findall(header.split(" Unit ", 1)[-1])
+
+
+def parse_price_rows(page_texts, version: str):
+    """Long-format price rows from per-page text (boilerplate already stripped)."""
+    rows, regions, pending, in_table = [], [], None, False
+    row_re = None
+    for page_no, text in enumerate(page_texts, start=1):
+        lines = [l.strip() for l in (text or "").splitlines() if l.strip()]
+        for k, line in enumerate(lines):
+            if line.startswith("Item Number") and " Unit" in line:
+                header = line
+                nxt = lines[k + 1] if k + 1 < len(lines) else ""
+                if nxt and not ITEM_RE.match(nxt) and len(nxt) <= 20 and "$" not in nxt:
+                    header += " " + nxt  # "... Very" / "Remote" wrapped
+                regions = _regions(header)
+                row_re = re.compile(rf'({ITEM_RE.pattern})\s+(.+?)\s*({UNITS})\s+'
+                                    rf'((?:{PRICE_TOKEN}\s*){{{len(regions)}}})$')
+                in_table, pending = bool(regions), None
+                continue
+            if not in_table or (pending is None and line in regions):
+                continue
+            if ITEM_RE.match(line):
+                pending = (page_no, line)
+            elif pending is not None:
+                pending = (pending[0], pending[1] + " " + line)
+            else:
+                in_table = False
+                continue
+            m = row_re.match(pending[1])
+            if m:
+                item, name, unit, prices = m.groups()
+                name = name.split(" • ", 1)[0].strip()  # drop bulleted notes
+                for region, tok in zip(regions, prices.split()):
+                    price = None if tok == "N/A" else float(tok.lstrip("$").replace(",", ""))
+                    rows.append({"papl_version": version, "item_number": item, "item_name": name,
+                                 "unit": unit, "region": region, "price": price,
+                                 "quotable": price is None, "page": pending[0]})
+                pending = None
+            elif len(pending[1]) > 400:
+                pending, in_table = None, False
+    return rows
+
+
+def write_price_db(db_path, version: str, rows, parquet_path=None):
+    import duckdb
+    con = duckdb.connect(str(db_path))
+    try:
+        con.execute(SCHEMA)
+        con.execute("CREATE INDEX IF NOT EXISTS price_item_idx ON price_limits(item_number)")
+        con.execute("DELETE FROM price_limits WHERE papl_version = ?", [version])
+        con.executemany(
+            "INSERT INTO price_limits VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(r["papl_version"], r["item_number"], r["item_name"], r["unit"], r["region"],
+              r["price"], r["quotable"], r["page"]) for r in rows],
+        )
+        if parquet_path:
+            con.sql("SELECT * FROM price_limits WHERE papl_version = ?", params=[version]) \
+               .write_parquet(str(parquet_path))
+    finally:
+        con.close()
+
+
+def _pivot(records):
+    items = {}
+    for item, name, unit, region, price, page in records:
+        row = items.setdefault(item, {"item_number": item, "item_name": name, "unit": unit,
+                                      "page": page, "prices": {}})
+        row["prices"][region] = price
+    return list(items.values())
+
+
+def lookup_prices(con, version: str, question: str, limit: int = 6):
+    """Structured matches for a price question, or [] to fall back to RAG.
+
+    Item numbers in the question are looked up exactly (index scan), and every
+    one found is returned. Otherwise the question must look like a price
+    question and every content word (all but one, for four or more) must start
+    a word in the item name. More than ``limit`` such items means the question
+    is too broad to list ("rate for therapy supports"), so it goes to RAG
+    rather than being answered with an arbitrary few.
+    """
+    cols = "item_number, item_name, unit, region, price, page"
+    items = ITEM_RE.findall(question)
+    if items:
+        marks = ", ".join("?" for _ in items)
+        recs = con.execute(f"SELECT {cols} FROM price_limits WHERE papl_version = ? "
+                           f"AND item_number IN ({marks}) ORDER BY item_number", [version, *items]).fetchall()
+        return _pivot(recs)
+    if not PRICE_HINT.search(question):
+        return []
+    words = [w for w in dict.fromkeys(re.findall(r"[a-z0-9]+", question.lower()))
+             if w not in STOPWORDS and (len(w) > 2 or w.isdigit())]
+    if not words:
+        return []
+    hits = " + ".join("CASE WHEN regexp_matches(lower(item_name), ?) THEN 1 ELSE 0 END" for _ in words)
+    params = [rf"\b{w}" for w in words]
+    recs = con.execute(
+        f"WITH scored AS (SELECT {cols}, ({hits}) AS hits FROM price_limits WHERE papl_version = ?), "
+        f"ranked AS (SELECT *, max(hits) OVER () AS best FROM scored) "
+        f"SELECT {cols} FROM ranked WHERE hits = best AND hits >= ? ORDER BY item_number, region",
+        [*params, version, len(words) - (1 if len(words) >= 4 else 0)],
+    ).fetchall()
+    found = _pivot(recs)
+    return found if len(found) <= limit else []
+
+
+def asked_regions(question: str):
+    q = question.lower()
+    out = []
+    if "very remote" in q:
+        out.append("Very Remote")
+    if re.search(r"(?<!very )remote", q):
+        out.append("Remote")
+    if "national" in q:
+        out.append("National")
+    return out
+
+
+def _fmt(price):
+    return "N/A (quotable)" if price is None else f"AUD${price:,.2f}"
+
+
+def format_price_answer(items, version: str, question: str = ""):
+    """Markdown answer with a citation per item; regions asked about are listed first."""
+    wanted = asked_regions(question)
+    lines = []
+    for it in items:
+        regions = wanted + [r for r in it["prices"] if r not in wanted]
+        prices = "; ".join(f"{r}: {_fmt(it['prices'][r])}" for r in regions if r in it["prices"])
+        lines.append(f"- **{it['item_number']}** {it['item_name']} (per {it['unit']}) — {prices} "
+                     f"(PAPL {version}, p.{it['page']})")
+    return "\n".join(lines)
@@ -0,0 +1,286 @@
+"""Process memory profiling for the app and the API.
+
+``Profiler`` collects, on demand:
+
+- RSS: sampled every ``sample_every`` seconds by a daemon thread into a ring
+  buffer, with the peak;
+- Python allocations: tracemalloc (started with the profiler, or later) top
+  lines by size, and the growth since a baseline snapshot, which is how a
+  regression shows up between two runs of the same workload;
+- cache occupancy: every cache registers a callable returning a dict
+  (entries, bytes, ...) with ``register_cache``;
+- per-session state: Streamlit sessions report the deep size of each
+  session_state key with ``track_session`` (stale sessions expire).
+
+``report()`` returns all of it as a JSON-serialisable dict; ``dump(path)``
+appends one line of it to a JSONL file, and ``start_dumper`` does so
+periodically. Nothing here imports Streamlit.
+
+Enable with ``PAPL_PROFILE=1``; ``PAPL_PROFILE_DUMP=<path>`` and
+``PAPL_PROFILE_DUMP_EVERY=<seconds>`` turn on the periodic dump.
+"""
+import json, os, sys, threading, time, tracemalloc
+from collections import deque
+
+from papl_collections import rss_mb
+
+SESSION_TTL = 1800  # seconds without a rerun before a session is dropped from the report
+
+
+def enabled() -> bool:
+    return os.environ.get("PAPL_PROFILE", "").lower() in ("1", "true", "yes")
+
+
+def deep_size(obj, limit: int = 200_000) -> int:
+    """Approximate bytes reachable from ``obj`` (numpy/pandas buffers included), visiting at most ``limit`` objects."""
+    seen, stack, total = set(), [obj], 0
+    while stack and len(seen) < limit:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        mod = type(o).__module__ or ""
+        if mod.startswith("numpy") and hasattr(o, "nbytes"):
+            total += sys.getsizeof(o) if getattr(o, "base", None) is not None else max(sys.getsizeof(o), o.nbytes)
+            continue
+        if mod.startswith("pandas") and hasattr(o, "memory_usage"):
+            usage = o.memory_usage(deep=True)
+            total += int(usage.sum() if hasattr(usage, "sum") else usage)
+            continue
+        try:
+            total += sys.getsizeof(o)
+        except TypeError:
+            continue
+        if isinstance(o, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys()); stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        else:
+            if hasattr(o, "__dict__"):
+                stack.append(vars(o))
+            for slot in getattr(type(o), "__slots__", ()):
+                if hasattr(o, slot):
+                    stack.append(getattr(o, slot))
+    return total
+
+
+def dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs) if path and os.path.isdir(path) else 0
+
+
+def _own(stat):
+    # tracemalloc's own bookkeeping and import machinery; filtered after grouping,
+    # since Snapshot.filter_traces costs seconds on a loaded process
+    where = stat.traceback[0].filename
+    return where == tracemalloc.__file__ or where.startswith("<frozen importlib")
+
+
+class Profiler:
+    """One per process; thread-safe."""
+
+    def __init__(self, sample_every: float = 5.0, history: int = 720, frames: int = 1):
+        self.sample_every, self.frames = sample_every, frames
+        self.samples = deque(maxlen=history)  # (unix time, rss MB)
+        self.peak_mb = 0.0
+        self.caches = {}
+        self.sessions = {}  # session id -> {"time", "bytes", "keys"}
+        self.baseline = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ---- lifecycle ----
+    def start(self, trace: bool = True):
+        if trace:
+            self.start_tracing()
+        self._spawn(self._sample_loop)
+        return self
+
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop_tracing(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.baseline = None
+
+    def stop(self):
+        self._stop.set()
+
+    def _spawn(self, fn, *args):
+        t = threading.Thread(target=fn, args=args, daemon=True, name=f"profiler-{fn.__name__}")
+        t.start()
+        self._threads.append(t)
+
+    def sample(self):
+        mb = rss_mb()
+        with self._lock:
+            self.samples.append((time.time(), mb))
+            self.peak_mb = max(self.peak_mb, mb)
+        return mb
+
+    def _sample_loop(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.sample_every)
+
+    # ---- sources ----
+    def register_cache(self, name: str, fn):
+        """``fn()`` returns a dict describing the cache (e.g. entries, bytes, max_bytes)."""
+        with self._lock:
+            self.caches[name] = fn
+
+    def track_session(self, session_id: str, state):
+        """Record the deep size of each key of one session's state (call on every rerun).
+
+        A session is re-measured at most every ``sample_every`` seconds, since
+        walking large row lists takes tens of milliseconds.
+        """
+        now = time.time()
+        last = self.sessions.get(session_id)
+        if last and now - last["time"] < self.sample_every:
+            return
+        keys = {str(k): deep_size(v) for k, v in dict(state).items()}
+        with self._lock:
+            self.sessions[session_id] = {"time": now, "bytes": sum(keys.values()), "keys": keys}
+            for sid in [s for s, v in self.sessions.items() if now - v["time"] > SESSION_TTL]:
+                del self.sessions[sid]
+
+    def mark_baseline(self):
+        """Remember the current allocations; later reports show growth since this point."""
+        self.start_tracing()
+        self.baseline = tracemalloc.take_snapshot()
+
+    # ---- output ----
+    def _allocations(self, top: int):
+        if not tracemalloc.is_tracing():
+            return None
+        snap = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        out = {"current_mb": current / 2**20, "peak_mb": peak / 2**20,
+               "top": [{"where": str(s.traceback), "kb": s.size / 1024, "count": s.count}
+                       for s in [s for s in snap.statistics("lineno") if not _own(s)][:top]]}
+        if self.baseline is not None:
+            out["growth"] = [{"where": str(d.traceback), "kb": d.size_diff / 1024, "count": d.count_diff}
+                             for d in [d for d in snap.compare_to(self.baseline, "lineno") if not _own(d)][:top]]
+        return out
+
+    def report(self, top: int = 15):
+        caches = {}
+        for name, fn in list(self.caches.items()):
+            try:
+                caches[name] = fn()
+            except Exception as e:  # a broken probe must not break the page
+                caches[name] = {"error": f"{type(e).__name__}: {e}"}
+        mb = self.sample()
+        with self._lock:
+            samples = list(self.samples)
+            sessions = {sid: dict(v, keys=dict(v["keys"])) for sid, v in self.sessions.items()}
+            peak = self.peak_mb
+        return {"time": time.time(), "pid": os.getpid(), "rss_mb": mb, "rss_peak_mb": peak,
+                "rss_samples": samples, "tracemalloc": self._allocations(top), "caches": caches,
+                "sessions": sessions}
+
+    def dump(self, path: str, top: int = 15):
+        rep = self.report(top)
+        rep.pop("rss_samples")  # the dump itself is the time series
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rep, default=str) + "\n")
+        return rep
+
+    def start_dumper(self, path: str, every: float = 60.0):
+        def _dump_loop(path, every):
+            while not self._stop.wait(every):
+                try:
+                    self.dump(path)
+                except Exception as e:
+                    print(f"profile dump to {path} failed: {e}", file=sys.stderr)
+        self._spawn(_dump_loop, path, every)
+
+
+def from_env():
+    """A started Profiler when PAPL_PROFILE is set, else None."""
+    if not enabled():
+        return None
+    prof = Profiler(sample_every=float(os.environ.get("PAPL_PROFILE_SAMPLE_EVERY", "5"))).start(
+        trace=os.environ.get("PAPL_PROFILE_TRACEMALLOC", "1") != "0")
+    if os.environ.get("PAPL_PROFILE_DUMP"):
+        prof.start_dumper(os.environ["PAPL_PROFILE_DUMP"], float(os.environ.get("PAPL_PROFILE_DUMP_EVERY", "60")))
+    return prof
+
+
+def partition_stats(partitions):
+    """Occupancy of a PartitionCache: per loaded edition, chunk count, estimated index bytes and its embedder."""
+    out = {"loaded": partitions.loaded(), "capacity": partitions.capacity,
+           "mem_budget_mb": partitions.mem_budget_mb, "partitions": {}}
+    for version, (col, _) in list(partitions._lru.items()):
+        n = col.count()
+        if hasattr(col, "nbytes"):  # compact snapshot: codes plus ids/metadata held in memory
+            info = {"kind": "compact", "chunks": n, "bytes": col.nbytes(),
+                    "meta_bytes": deep_size((col.ids, col.metadatas, col._offsets))}
+        else:
+            sample = col.get(limit=1, include=["embeddings"])["embeddings"] if n else []
+            dim = len(sample[0]) if sample else 0
+            # hnswlib holds float32 vectors plus ~2*M neighbour ids per element at level 0
+            m = int((col.metadata or {}).get("hnsw:M", 16))
+            info = {"kind": "chroma", "chunks": n, "dim": dim, "bytes": n * (dim * 4 + m * 2 * 4)}
+        ef = getattr(col, "_embedding_function", None) or getattr(col, "_ef", None)
+        if ef is not None:
+            info["embedder"] = embedder_stats(ef)
+        out["partitions"][version] = info
+    return out
+
+
+def embedder_stats(ef):
+    """Whether the query embedding model is loaded, and its weight bytes."""
+    model = getattr(ef, "_model", None) or getattr(ef, "model", None)
+    out = {"class": type(ef).__name__, "loaded": model is not None}
+    if hasattr(model, "parameters"):  # sentence-transformers / torch
+        out["bytes"] = sum(p.numel() * p.element_size() for p in model.parameters())
+    elif hasattr(ef, "DOWNLOAD_PATH"):  # chroma's ONNX MiniLM: weights are mapped from model.onnx
+        out["bytes"] = dir_bytes(str(ef.DOWNLOAD_PATH)) if model is not None else 0
+    return out
+
+
+def watch(prof, partitions=None, renderer=None, page_cache_dir=None, embedder=None):
+    """Register the caches the app and API hold.
+
+    ``partitions``, ``renderer`` and ``embedder`` are zero-argument callables
+    returning the PartitionCache, PageRenderer and query embedding function,
+    so a report reads whatever instance is current.
+    """
+    if partitions is not None:
+        prof.register_cache("partitions", lambda: partition_stats(partitions()))
+    if renderer is not None:
+        prof.register_cache("rendered_pages", lambda: dict(renderer().cache.stats(), on_disk=True))
+    if page_cache_dir:
+        prof.register_cache("page_text", lambda: {
+            "entries": len(os.listdir(page_cache_dir)) if os.path.isdir(page_cache_dir) else 0,
+            "bytes": dir_bytes(page_cache_dir), "on_disk": True})
+    if embedder is not None:
+        prof.register_cache("embedder", lambda: embedder_stats(embedder()))
+    return prof
+
+
+def cache_rows(report):
+    """One flat row per cache (per partition, and per partition embedder) for a table."""
+    rows = []
+    for name, info in report["caches"].items():
+        if name == "partitions" and "partitions" in info:
+            for version, p in info["partitions"].items():
+                rows.append({"cache": f"partition {version}", "entries": p["chunks"],
+                             "MB": (p["bytes"] + p.get("meta_bytes", 0)) / 2**20, "detail": p["kind"]})
+                if "embedder" in p:
+                    rows.append({"cache": f"partition {version} embedder", "entries": int(p["embedder"]["loaded"]),
+                                 "MB": p["embedder"].get("bytes", 0) / 2**20, "detail": p["embedder"]["class"]})
+            continue
+        rows.append({"cache": name, "entries": info.get("entries", int(info.get("loaded", 0))),
+                     "MB": info.get("bytes", 0) / 2**20,
+                     "detail": info.get("error") or info.get("class") or ", ".join(filter(None, [
+                         "on disk" if info.get("on_disk") else "",
+                         f"{info['hits']} hits / {info['misses']} misses" if "hits" in info else ""]))})
+    return rows
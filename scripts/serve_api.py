@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+"""HTTP API for PAPL retrieval and answers, for callers that can't drive the UI.
+
+Endpoints (JSON in, JSON out):
+
+    GET  /health                           editions available and loaded
+    GET  /page?version=&page=&chunk=&crop= PNG of one PDF page, the chunk's passage highlighted
+    GET  /profile?top=&baseline=           memory report (PAPL_PROFILE=1 and PAPL_ADMIN_TOKEN, sent as a
+                                           bearer token; see profiling.py)
+    POST /retrieve {"query", "version"?, "top_k"?, "filters"?}
+    POST /answer   {"question", "version"?, "stream"?, "filters"?}
+    POST /batch    {"questions": [...], "mode": "retrieve" | "answer", "version"?, "top_k"?, "filters"?}
+
+``filters`` restricts the search to chunks with the given support_purpose,
+support_category and/or registration_group.
+
+``/answer`` tries the edition diff and the price tables before retrieval +
+LLM, like the app. With ``"stream": true`` it replies with server-sent events:
+one ``sources`` event, ``delta`` events as the model writes, then ``done``.
+Without an API key, or when the model call fails or times out
+(``PAPL_LLM_TIMEOUT``), the answer is extracted from the sources instead
+(``"source": "extractive"``).
+Every source carries a ``page_url`` for ``/page``. Rendered pages are cached on
+disk by PDF hash and page (``render_cache_dir``, ``render_cache_mb``) and are
+sent with an ETag, so repeat views cost a file read or a 304.
+The Chroma client, partitions and OpenAI client are created once; requests
+are served on a thread each.
+
+    python scripts/serve_api.py --config config.yaml --port 8530
+"""
+import argparse, hmac, json, os, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import papl_qa, profiling
+from page_render import PageRenderer
+from papl_collections import PartitionCache, UnknownVersion, discover_versions
+
+MAX_BODY = 1 << 20
+MAX_BATCH = 64
+
+
+class PaplService:
+    """Everything loaded once per process and shared by request threads."""
+
+    def __init__(self, cfg, top_k: int = 12, ctx_k: int = 6, workers: int = 4):
+        import chromadb
+        self.persist_dir = os.environ.get("CHROMA_DIR") or cfg.get("persist_dir", "data/chroma")
+        self.alias = cfg.get("collection_name", "papl_chunks")
+        self.default_version = cfg.get("papl_version", "2025-26")
+        self.pdfs = {self.default_version: cfg.get("pdf_path", "")}
+        self.price_db = cfg.get("price_db", "data/papl_prices.duckdb")
+        self.diff_db = cfg.get("diff_db", "data/papl_diff.duckdb")
+        self.top_k, self.ctx_k = top_k, ctx_k
+        self.partitions = PartitionCache(
+            chromadb.PersistentClient(path=self.persist_dir), self.persist_dir, self.alias,
+            capacity=int(os.environ.get("PAPL_MAX_LOADED_VERSIONS", "2")),
+            mem_budget_mb=float(os.environ.get("PAPL_PARTITION_MEM_MB", "0")),
+            compact_dir=cfg.get("compact_dir", "data/compact") if cfg.get("compact_embeddings") else None,
+        )
+        self.mode, self.llm = None, None
+        if os.getenv("OPENAI_API_KEY"):
+            self.mode, self.llm = papl_qa.openai_client(os.environ["OPENAI_API_KEY"])
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.renderer = PageRenderer(cfg.get("render_cache_dir", "data/cache/render"),
+                                     float(cfg.get("render_cache_mb", 64)))
+        self.admin_token = os.environ.get("PAPL_ADMIN_TOKEN", "")
+        self.profiler = profiling.from_env()
+        if self.profiler is not None:
+            profiling.watch(self.profiler, lambda: self.partitions, lambda: self.renderer, cfg.get("page_cache_dir"))
+
+    def versions(self):
+        return discover_versions("data", self.persist_dir, self.alias) or [self.default_version]
+
+    def version(self, version=None):
+        """``version`` (default edition if empty), or UnknownVersion before any index is touched."""
+        version = version or self.default_version
+        if not isinstance(version, str) or version not in self.versions():
+            raise UnknownVersion(f"unknown PAPL version {version!r}")
+        return version
+
+    def retrieve(self, queries, version=None, top_k=None, filters=None):
+        return papl_qa.retrieve(self.partitions, queries, self.version(version), int(top_k or self.top_k), filters)
+
+    def shortcut(self, question: str, version: str):
+        """Answer from the diff or price tables without retrieval, or None."""
+        changes = papl_qa.change_answer(self.diff_db, question, version)
+        if changes:
+            return {"answer": changes[1], "source": "edition_diff", "compared_with": changes[0]}
+        price_md = papl_qa.price_answer(self.price_db, question, version)
+        if price_md:
+            return {"answer": price_md, "source": "price_tables"}
+        return None
+
+    def answer(self, question: str, version=None, rows=None, filters=None):
+        version = self.version(version)
+        hit = self.shortcut(question, version)
+        if hit:
+            return dict(hit, version=version, sources=[])
+        if rows is None:
+            rows = self.retrieve([question], version, self.ctx_k if filters else None, filters)[0]
+        rows = rows[: self.ctx_k]
+        text, source, error = None, "none", None
+        if rows and self.llm is not None:
+            try:
+                text = papl_qa.complete(self.mode, self.llm, question, [(r["full_text"], r["_meta"]) for r in rows])
+                source = "llm"
+            except Exception as e:  # timeout or API error: fall back to extraction
+                error = f"{type(e).__name__}: {e}"
+        out = {"version": version, "sources": [public(r) for r in rows]}
+        if text is None and rows:
+            text, sentences = papl_qa.local_answer(question, rows)
+            source = "extractive" if text else "none"
+            out["sentences"] = sentences
+        if error:
+            out["llm_error"] = error
+        return dict(out, answer=text, source=source)
+
+    def page(self, version: str, page: int, chunk_id: str = None, crop: bool = False):
+        """(png bytes, cache key) for a page of the edition's PDF, highlighting ``chunk_id``'s text."""
+        with self.partitions.lease(self.version(version)) as (col, where):
+            if chunk_id:
+                got = col.get(ids=[chunk_id], include=["documents", "metadatas"])
+            else:
+                got = col.get(where=where, limit=1, include=["metadatas"])
+        if not got["ids"]:
+            raise KeyError(f"no chunk {chunk_id!r} in PAPL {version}" if chunk_id else f"no chunks for PAPL {version}")
+        passage, meta = (got["documents"][0] if chunk_id else ""), got["metadatas"][0]
+        pdf = papl_qa.source_pdf(meta.get("source_pdf_path", ""), meta.get("papl_version") or version, self.pdfs)
+        if not pdf:
+            raise KeyError(f"PDF for PAPL {version} is not available on this server")
+        return self.renderer.render(pdf, page, passage, crop)
+
+    def batch(self, questions, mode="retrieve", version=None, top_k=None, filters=None):
+        # one embedding + search call for the whole batch; LLM calls fan out to the pool
+        version = self.version(version)
+        results = self.retrieve(questions, version, top_k, filters)
+        if mode == "retrieve":
+            return [{"query": q, "results": [public(r) for r in rows]} for q, rows in zip(questions, results)]
+        futures = [self.pool.submit(self.answer, q, version, rows) for q, rows in zip(questions, results)]
+        return [dict(f.result(), question=q) for q, f in zip(questions, futures)]
+
+
+def public(row):
+    out = {k: v for k, v in row.items() if not k.startswith("_") and k != "preview"}
+    if row.get("page") is not None and row.get("id"):
+        out["page_url"] = (f"/page?version={quote(str(row['papl_version']))}&page={row['page']}"
+                           f"&chunk={quote(str(row['id']))}")
+    return out
+
+
+class Handler(BaseHTTPRequestHandler):
+    service: PaplService = None
+    server_version = "papl-api/1"
+
+    def log_message(self, fmt, *args):
+        sys.stderr.write(f"[{threading.current_thread().name}] {self.address_string()} {fmt % args}\n")
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _event(self, name, payload):
+        self.wfile.write(f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        if n > MAX_BODY:
+            raise ValueError("request body too large")
+        data = json.loads(self.rfile.read(n) or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return data
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") == "/health":
+            self._send(200, {"status": "ok", "versions": self.service.versions(),
+                             "loaded": self.service.partitions.loaded(), "llm": self.service.llm is not None,
+                             "render_cache": self.service.renderer.cache.stats()})
+        elif url.path.rstrip("/") == "/profile" and self.service.profiler is not None and self.service.admin_token:
+            sent = self.headers.get("Authorization", "").encode("utf-8", "replace")
+            if not hmac.compare_digest(sent, f"Bearer {self.service.admin_token}".encode("utf-8")):
+                return self._send(401, {"error": "admin token required"})
+            query = parse_qs(url.query)
+            if (query.get("baseline") or ["0"])[0] in ("1", "true"):
+                self.service.profiler.mark_baseline()
+            top = (query.get("top") or ["15"])[0]
+            self._send(200, self.service.profiler.report(int(top) if top.isdigit() else 15))
+        elif url.path.rstrip("/") == "/page":
+            try:
+                self._page(parse_qs(url.query))
+            except (ValueError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+            except KeyError as e:
+                self._send(404, {"error": e.args[0] if e.args else "not found"})
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self._send(404, {"error": f"no route {self.path}"})
+
+    def _page(self, query):
+        arg = lambda k, default=None: (query.get(k) or [default])[0]
+        if not (arg("page") or "").isdigit():
+            raise ValueError("'page' must be a page number")
+        version = arg("version") or self.service.default_version
+        png, key = self.service.page(version, int(arg("page")), arg("chunk"), arg("crop", "0") in ("1", "true"))
+        etag = f'"{key}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(png)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "public, max-age=86400")  # the key includes the PDF hash
+        self.end_headers()
+        self.wfile.write(png)
+
+    def do_POST(self):
+        route = {"/retrieve": self._retrieve, "/answer": self._answer, "/batch": self._batch}.get(self.path.rstrip("/"))
+        if route is None:
+            return self._send(404, {"error": f"no route {self.path}"})
+        try:
+            route(self._body())
+        except UnknownVersion as e:
+            self._send(404, {"error": e.args[0]})
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _retrieve(self, req):
+        query = _text(req, "query")
+        rows = self.service.retrieve([query], req.get("version"), req.get("top_k"), _filters(req))[0]
+        self._send(200, {"query": query, "results": [public(r) for r in rows]})
+
+    def _answer(self, req):
+        question = _text(req, "question")
+        if not req.get("stream"):
+            return self._send(200, self.service.answer(question, req.get("version"), filters=_filters(req)))
+        self._stream_answer(question, self.service.version(req.get("version")), _filters(req))
+
+    def _stream_answer(self, question, version, filters=None):
+        svc = self.service
+        hit = svc.shortcut(question, version)
+        rows = [] if hit else svc.retrieve([question], version, svc.ctx_k if filters else None, filters)[0][: svc.ctx_k]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        self._event("sources", {"version": version, "sources": [public(r) for r in rows]})
+        source, sent = (hit["source"], True) if hit else ("none", False)
+        if hit:
+            self._event("delta", {"text": hit["answer"]})
+        elif rows and svc.llm is not None:
+            try:
+                for text in papl_qa.complete(svc.mode, svc.llm, question,
+                                             [(r["full_text"], r["_meta"]) for r in rows], stream=True):
+                    self._event("delta", {"text": text})
+                    source, sent = "llm", True
+            except Exception as e:
+                self._event("error", {"error": f"{type(e).__name__}: {e}"})
+        if not sent and rows:
+            # no model, or it failed before writing anything
+            text, _ = papl_qa.local_answer(question, rows)
+            if text:
+                self._event("delta", {"text": text})
+                source = "extractive"
+        self._event("done", {"source": source})
+
+    def _batch(self, req):
+        questions = req.get("questions")
+        if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+            raise ValueError("'questions' must be a non-empty list of strings")
+        if len(questions) > MAX_BATCH:
+            raise ValueError(f"at most {MAX_BATCH} questions per batch")
+        mode = req.get("mode", "retrieve")
+        if mode not in ("retrieve", "answer"):
+            raise ValueError("'mode' must be 'retrieve' or 'answer'")
+        results = self.service.batch(questions, mode, req.get("version"), req.get("top_k"), _filters(req))
+        self._send(200, {"mode": mode, "results": results})
+
+
+def _filters(req):
+    filters = req.get("filters") or None
+    if filters is not None and not isinstance(filters, dict):
+        raise ValueError("'filters' must be an object")
+    papl_qa.where_clause(None, filters)  # rejects unknown keys before any work
+    return filters
+
+
+def _text(req, key):
+    value = req.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{key}' must be a non-empty string")
+    return value.strip()
+
+
+def main():
+    import yaml
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8530)
+    ap.add_argument("--top-k", type=int, default=12)
+    ap.add_argument("--ctx-k", type=int, default=6, help="passages sent to the model")
+    ap.add_argument("--workers", type=int, default=4, help="parallel LLM calls per /batch")
+    args = ap.parse_args()
+
+    cfg = yaml.safe_load(open(args.config))
+    Handler.service = PaplService(cfg, top_k=args.top_k, ctx_k=args.ctx_k, workers=args.workers)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"PAPL API on http://{args.host}:{args.port} (versions: {', '.join(Handler.service.versions())})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
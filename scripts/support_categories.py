@@ -0,0 +1,113 @@
+"""Support purpose, support category and registration group for each chunk.
+
+Support item numbers encode both: in ``01_011_0107_1_1`` the first field is
+the (legacy) support category and the third the registration group. Chunks
+inside a "Core – …", "Capital – …" or "Capacity Building – …" chapter take
+its purpose and category; elsewhere (e.g. the general claiming rules) the
+most common category among quoted item numbers is used. The registration
+group is the most common one quoted, else the group whose name matches the
+chunk's heading. Group names are read from the edition's own
+"Registration Groups" table. The values are plain strings ("" when unknown)
+so Chroma can filter on them.
+"""
+import re
+from bisect import bisect_right
+from collections import Counter
+
+from price_tables import ITEM_RE
+
+PURPOSES = ("Core", "Capacity Building", "Capital")
+CATEGORIES = {  # legacy support category number -> (purpose, name)
+    "01": ("Core", "Assistance with Daily Life"),
+    "02": ("Core", "Transport"),
+    "03": ("Core", "Consumables"),
+    "04": ("Core", "Assistance with Social, Economic and Community Participation"),
+    "05": ("Capital", "Assistive Technology"),
+    "06": ("Capital", "Home Modifications and Specialist Disability Accommodation"),
+    "07": ("Capacity Building", "Support Coordination"),
+    "08": ("Capacity Building", "Improved Living Arrangements"),
+    "09": ("Capacity Building", "Increased Social and Community Participation"),
+    "10": ("Capacity Building", "Finding and Keeping a Job"),
+    "11": ("Capacity Building", "Improved Relationships"),
+    "12": ("Capacity Building", "Improved Health and Wellbeing"),
+    "13": ("Capacity Building", "Improved Learning"),
+    "14": ("Capacity Building", "Improved Life Choices"),
+    "15": ("Capacity Building", "Improved Daily Living"),
+}
+PURPOSE_HEADING = re.compile(r'^(Core|Capital|Capacity Building)\s*[–-]\s*(.+)$')
+GROUP_LINE = re.compile(r'^(01[0-3]\d)\s+(\S.{3,90})$')
+
+
+def parse_registration_groups(page_texts):
+    """{"0107": "Daily Personal Activities", ...} from the Registration Groups table."""
+    groups = {}
+    for text in page_texts:
+        if "Registration Group" not in (text or ""):
+            continue
+        for line in text.splitlines():
+            m = GROUP_LINE.match(line.strip())
+            if m and "$" not in line and not ITEM_RE.search(line):
+                groups.setdefault(m.group(1), m.group(2).strip())
+    return groups
+
+
+def _category_of_heading(title: str):
+    m = PURPOSE_HEADING.match(title.strip())
+    if not m:
+        return None
+    purpose, name = m.group(1), m.group(2).strip()
+    low = name.lower()
+    for pur, cat in CATEGORIES.values():
+        if pur == purpose and (cat.lower().startswith(low) or low.startswith(cat.lower())):
+            return purpose, cat
+    return purpose, name
+
+
+class CategoryIndex:
+    """Bisect lookup of the chapter-level (purpose, category) at a stream offset.
+
+    A "Core – …"-style heading (any level) opens a chapter; any other
+    top-level heading closes it.
+    """
+
+    def __init__(self, placed):
+        self.offsets, self.values = [], []
+        for off, h in placed:
+            cat = _category_of_heading(h.title)
+            if cat is None and h.level != 0:
+                continue
+            self.offsets.append(off)
+            self.values.append(cat or ("", ""))
+
+    def lookup(self, offset):
+        i = bisect_right(self.offsets, offset) - 1
+        return self.values[i] if i >= 0 else ("", "")
+
+
+def _group_from_title(groups, *titles):
+    for title in titles:
+        t = (title or "").lower()
+        if len(t) < 6:
+            continue
+        for code, name in groups.items():
+            n = name.lower()
+            if n == t or (len(n) >= 12 and n in t):
+                return code
+    return ""
+
+
+def tag_chunk(text: str, chapter=("", ""), groups=None, titles=()):
+    """support_purpose / support_category / registration_group metadata for one chunk."""
+    groups = groups or {}
+    purpose, category = chapter
+    items = ITEM_RE.findall(text)
+    if items:
+        if not purpose:
+            cat_code = Counter(i[:2] for i in items).most_common(1)[0][0]
+            purpose, category = CATEGORIES.get(cat_code, ("", ""))
+        group = Counter(i.split("_")[2] for i in items).most_common(1)[0][0]
+    else:
+        group = _group_from_title(groups, *titles)
+    name = groups.get(group, "")
+    return {"support_purpose": purpose, "support_category": category,
+            "registration_group": f"{group} {name}".strip() if group else ""}
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+"""Sweep HNSW parameters for the PAPL index against a gold question set.
+
+The live partition's stored embeddings are re-indexed with hnswlib (the
+library inside Chroma) for every (space, M, construction_ef) combination,
+then queried at each search_ef. For every setting it reports:
+
+- recall@k: overlap with an exact (brute-force) top-k in the same space;
+- gold hit@k: share of questions where a retrieved chunk covers one of the
+  question's expected pages (``data/gold_questions.jsonl``), next to the
+  same measure for exact search, which bounds what tuning can achieve;
+- p50/p95 single-query latency, build time and on-disk index size.
+
+Settings on the recall/latency/size frontier are starred, and the cheapest
+one reaching ``--target`` recall is printed as a ``hnsw:`` block for
+config.yaml. Queries are embedded with the same model as ingest.
+
+    python scripts/tune_hnsw.py --config config.yaml --k 6
+"""
+import argparse, itertools, json, os, statistics, sys, tempfile, time
+
+import numpy as np
+
+from papl_collections import hnsw_metadata, resolve_partition
+
+
+def _ints(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def load_corpus(client, persist_dir, alias: str, version: str):
+    """(embeddings, metadatas, recorded collection metadata) for one edition."""
+    name, shared = resolve_partition(client, persist_dir, alias, version)
+    col = client.get_collection(name)
+    got = col.get(where={"papl_version": version} if shared else None, include=["embeddings", "metadatas"])
+    if not got["ids"]:
+        raise ValueError(f"no chunks for PAPL {version} in '{name}'; ingest first")
+    return np.asarray(got["embeddings"], dtype=np.float32), got["metadatas"], col.metadata or {}
+
+
+def load_gold(path):
+    with open(path, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    return [it["question"] for it in items], [set(it.get("pages", [])) for it in items]
+
+
+def embed_queries(questions, use_openai: bool = False):
+    from chromadb.utils import embedding_functions
+    if use_openai:
+        ef = embedding_functions.OpenAIEmbeddingFunction(
+            api_key=os.environ["OPENAI_API_KEY"], model_name="text-embedding-3-small")
+    else:
+        ef = embedding_functions.DefaultEmbeddingFunction()
+    return np.asarray(ef(questions), dtype=np.float32)
+
+
+def _normalise(x):
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def exact_topk(X, Q, space: str, k: int):
+    if space == "cosine":
+        scores = _normalise(Q) @ _normalise(X).T
+    elif space == "ip":
+        scores = Q @ X.T
+    else:
+        scores = -((Q[:, None, :] - X[None, :, :]) ** 2).sum(-1)
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def _covers(meta, pages):
+    p0 = int(meta.get("page_start", meta.get("page", 0)) or 0)
+    p1 = int(meta.get("page_end", p0) or p0)
+    alts = {int(p) for p in str(meta.get("alt_pages") or "").split(",") if p}  # merged near-duplicates
+    return any(p0 <= p <= p1 or p in alts for p in pages)
+
+
+def gold_hits(labels, metas, gold_pages):
+    """Share of questions (with expected pages) answered by at least one retrieved chunk."""
+    scored = [(row, pages) for row, pages in zip(labels, gold_pages) if pages]
+    if not scored:
+        return float("nan")
+    return sum(any(_covers(metas[i], pages) for i in row) for row, pages in scored) / len(scored)
+
+
+def index_size(index):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.bin")
+        index.save_index(path)
+        return os.path.getsize(path)
+
+
+def sweep(X, Q, metas, gold_pages, spaces, Ms, construction_efs, search_efs, k: int = 6, repeat: int = 3):
+    import hnswlib
+    n, dim = X.shape
+    k = min(k, n)
+    results = []
+    for space in spaces:
+        truth = exact_topk(X, Q, space, k)
+        exact_hit = gold_hits(truth, metas, gold_pages)
+        for M, cef in itertools.product(Ms, construction_efs):
+            index = hnswlib.Index(space=space, dim=dim)
+            t0 = time.perf_counter()
+            index.init_index(max_elements=n, M=M, ef_construction=cef, random_seed=100)
+            index.add_items(X, np.arange(n), num_threads=1)
+            build_s = time.perf_counter() - t0
+            size_mb = index_size(index) / 2**20
+            for ef in search_efs:
+                index.set_ef(max(ef, k))
+                lat, labels = [], []
+                for q in Q:
+                    best = None
+                    for _ in range(repeat):
+                        t0 = time.perf_counter()
+                        ids, _ = index.knn_query(q[None, :], k=k, num_threads=1)
+                        dt = time.perf_counter() - t0
+                        best = dt if best is None else min(best, dt)
+                    lat.append(best * 1000)
+                    labels.append(ids[0])
+                recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(labels, truth)])
+                lat.sort()
+                results.append({
+                    "space": space, "M": M, "construction_ef": cef, "search_ef": ef,
+                    "recall": float(recall), "gold_hit": gold_hits(labels, metas, gold_pages),
+                    "exact_gold_hit": exact_hit, "p50_ms": statistics.median(lat),
+                    "p95_ms": lat[min(len(lat) - 1, int(0.95 * len(lat)))],
+                    "build_s": build_s, "size_mb": size_mb,
+                })
+    return results
+
+
+def frontier(results):
+    """Settings no other setting beats on recall, p50 latency and index size at once."""
+    def dominates(a, b):
+        better_eq = a["recall"] >= b["recall"] and a["p50_ms"] <= b["p50_ms"] and a["size_mb"] <= b["size_mb"]
+        strictly = a["recall"] > b["recall"] or a["p50_ms"] < b["p50_ms"] or a["size_mb"] < b["size_mb"]
+        return better_eq and strictly
+    return [r for r in results if not any(dominates(o, r) for o in results if o is not r)]
+
+
+def main():
+    import yaml
+    import chromadb
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--version", help="PAPL edition to tune on (default: papl_version)")
+    ap.add_argument("--gold", default="data/gold_questions.jsonl")
+    ap.add_argument("--k", type=int, default=6, help="results per query (the app sends 6 to the model)")
+    ap.add_argument("--spaces", default="cosine,l2")
+    ap.add_argument("--M", default="8,16,32,48")
+    ap.add_argument("--construction-ef", default="64,128,200,400")
+    ap.add_argument("--search-ef", default="10,16,32,64,128,256")
+    ap.add_argument("--target", type=float, default=0.99, help="recall@k to aim for in the suggestion")
+    ap.add_argument("--openai", action="store_true", help="index was built with OpenAI embeddings")
+    ap.add_argument("--csv", help="also write every row to this CSV")
+    args = ap.parse_args()
+
+    cfg = yaml.safe_load(open(args.config))
+    persist_dir = cfg.get("persist_dir", "data/chroma")
+    version = args.version or cfg["papl_version"]
+    client = chromadb.PersistentClient(path=persist_dir)
+    X, metas, recorded = load_corpus(client, persist_dir, cfg.get("collection_name", "papl_chunks"), version)
+    questions, gold_pages = load_gold(args.gold)
+    Q = embed_queries(questions, args.openai)
+    if Q.shape[1] != X.shape[1]:
+        sys.exit(f"query embeddings have {Q.shape[1]} dims but the index has {X.shape[1]}; "
+                 "pass --openai if it was ingested with OpenAI embeddings")
+
+    live = {k: v for k, v in recorded.items() if k.startswith("hnsw:")} or "Chroma defaults (l2, M=16, ef 100/10)"
+    print(f"PAPL {version}: {len(X)} chunks x {X.shape[1]} dims, {len(questions)} gold questions; live index: {live}")
+    results = sweep(X, Q, metas, gold_pages, args.spaces.split(","), _ints(args.M),
+                    _ints(args.construction_ef), _ints(args.search_ef), k=args.k)
+    front = {id(r) for r in frontier(results)}
+
+    print(f"\n{'':1} {'space':<6} {'M':>3} {'c_ef':>5} {'s_ef':>5} {'recall':>7} {'gold':>6} {'exact':>6} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'build s':>8} {'size MB':>8}")
+    for r in sorted(results, key=lambda r: (r["space"], -r["recall"], r["p50_ms"])):
+        print(f"{'*' if id(r) in front else ' '} {r['space']:<6} {r['M']:>3} {r['construction_ef']:>5} "
+              f"{r['search_ef']:>5} {r['recall']:>7.3f} {r['gold_hit']:>6.3f} {r['exact_gold_hit']:>6.3f} "
+              f"{r['p50_ms']:>7.3f} {r['p95_ms']:>7.3f} {r['build_s']:>8.3f} {r['size_mb']:>8.2f}")
+
+    if args.csv:
+        import csv
+        with open(args.csv, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=list(results[0]))
+            w.writeheader()
+            w.writerows(results)
+
+    ok = [r for r in results if r["recall"] >= args.target]
+    if not ok:
+        print(f"\nNo setting reached recall {args.target}; widen --M/--search-ef.")
+        return
+    best = min(ok, key=lambda r: (r["p50_ms"], r["size_mb"], r["build_s"]))
+    meta = hnsw_metadata({k: best[k] for k in ("space", "M", "construction_ef", "search_ef")})
+    print(f"\nFastest setting with recall@{args.k} >= {args.target} (* = on the frontier):")
+    print("hnsw:\n" + "\n".join(f"  {k.split(':', 1)[1]}: {json.dumps(v)}" for k, v in meta.items()))
+
+
+if __name__ == "__main__":
+    main()